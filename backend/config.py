@@ -13,6 +13,8 @@ class Settings(BaseSettings):
     DB_HOST: str
     DB_PORT: int
     DB_NAME: str
+    ASYNC_DB_POOL_SIZE: int = 20
+    ASYNC_DB_MAX_OVERFLOW: int = 30
 
     # Security / JWT
     SECRET_KEY: str
@@ -24,19 +26,132 @@ class Settings(BaseSettings):
     AWS_SECRET_ACCESS_KEY: str
     AWS_REGION: str
     S3_BUCKET_NAME: str
+    S3_UPLOAD_CONCURRENCY: int = 16
 
     # Celery
     CELERY_BROKER_URL: str
     CELERY_RESULT_BACKEND: str
 
+    # Redis (defaults to the Celery broker)
+    REDIS_URL: str | None = None
+
     # Llama Parse
     LLAMA_PARSE_API_KEY: str
 
+    # Document parser: "llamaparse" or "local" (PyMuPDF, no network)
+    PARSER_BACKEND: str = "llamaparse"
+    PARSER_WORKERS: int = 4
+    PARSER_PAGES_PER_TASK: int = 8
+    # Parsed pages are persisted and queued for summarization in groups of
+    # this many while a streaming parser (local) continues; other backends
+    # persist the whole document at once.
+    INGEST_FLUSH_PAGES: int = 4
+
+    # Image preprocessing before upload and summarization
+    IMAGE_PREPROCESS_ENABLED: bool = True
+    IMAGE_MAX_SIDE: int = 1024
+    IMAGE_OUTPUT_FORMAT: str = "webp"  # "webp", "jpeg" or "png"
+    IMAGE_QUALITY: int = 85
+    # Smaller, extremely elongated or near-flat images are dropped.
+    IMAGE_MIN_SIDE: int = 32
+    IMAGE_MAX_ASPECT_RATIO: float = 8.0
+    IMAGE_MIN_STDDEV: float = 6.0
+    # Max dHash bit distance for two images to count as the same.
+    IMAGE_DEDUPE_DISTANCE: int = 4
+
+    # Parse results cache, keyed by the SHA-256 of the uploaded file. Lives
+    # on the image volume shared by the api and worker containers.
+    PARSE_CACHE_ENABLED: bool = True
+    PARSE_CACHE_DIR: str = "./images/parse-cache"
+
     # OpenAI
     OPENAI_API_KEY: str
+    SUMMARY_MODEL: str = "gpt-5-mini"
+    # Image pages summarized per request; 1 sends one request per page.
+    SUMMARY_BATCH_SIZE: int = 4
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+    EMBEDDING_DIMENSIONS: int = 384
+
+    # Query embedding cache
+    QUERY_EMBEDDING_CACHE_SIZE: int = 2048
+    QUERY_EMBEDDING_CACHE_TTL: int = 24 * 60 * 60
+    QUERY_EMBEDDING_CACHE_REDIS: bool = True
+
+    # Ingestion mode: "online" (per-chunk calls) or "bulk" (provider batch
+    # jobs, cheaper but may take up to the 24 h completion window).
+    INGEST_MODE: str = "online"
+    # "openai" or "local" (file-based simulator, no network)
+    BATCH_BACKEND: str = "openai"
+    BATCH_WORK_DIR: str = "./images/batch-jobs"
+    BATCH_MAX_REQUESTS: int = 50000
+    BATCH_POLL_INTERVAL: int = 60
+    # Consecutive poll errors before a job's chunks go to online ingestion
+    BATCH_POLL_MAX_ERRORS: int = 10
+
+    # Worker LLM quotas, shared across processes through Redis. Set them a
+    # little under the provider limits for the account.
+    SUMMARY_RPM: int = 500
+    SUMMARY_TPM: int = 200000
+    EMBEDDING_RPM: int = 3000
+    EMBEDDING_TPM: int = 1000000
+    LLM_INITIAL_CONCURRENCY: int = 4
+    LLM_MAX_CONCURRENCY: int = 32
+    LLM_MAX_RETRIES: int = 5
+
+    # Hybrid retrieval fusion: "rrf", "combsum" or "combmnz"
+    FUSION_METHOD: str = "rrf"
+    RRF_K: int = 60
+    FUSION_DENSE_WEIGHT: float = 1.0
+    FUSION_SPARSE_WEIGHT: float = 1.0
+    # Score normalization for combsum/combmnz: "minmax", "zscore" or "none"
+    FUSION_NORMALIZATION: str = "minmax"
+
+    # BM25 sparse search
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+
+    # Semantic answer cache (opt-in per message)
+    ANSWER_CACHE_SIMILARITY: float = 0.97
+
+    # Ingestion embedding batches
+    EMBED_BATCH_SIZE: int = 128
+    EMBED_BATCH_MAX_TOKENS: int = 200000
+    EMBED_BATCH_TIMEOUT: float = 1.0
+    # Seconds a flush may hold inputs before they are handed out again
+    EMBED_LEASE_TIMEOUT: int = 300
+    # "redis" or "memory" (single process: tests, eager Celery)
+    EMBED_QUEUE: str = "redis"
+    # "litellm" or "fake" (deterministic vectors, no network)
+    EMBED_PROVIDER: str = "litellm"
 
     # Cohere
     COHERE_API_KEY: str
 
+    # Reranking: "cohere" or "local" (ONNX cross-encoder on CPU)
+    RERANK_BACKEND: str = "cohere"
+    RERANK_TOP_N: int = 3
+    RERANK_COHERE_MODEL: str = "rerank-v4.0-pro"
+    # Directory with model.onnx and tokenizer.json
+    RERANK_MODEL_PATH: str = "./models/reranker"
+    RERANK_BATCH_SIZE: int = 16
+    RERANK_MAX_LENGTH: int = 512
+    RERANK_THREADS: int = 4
+    # Passages are cut to this many tokens before scoring
+    RERANK_MAX_PASSAGE_TOKENS: int = 512
+    # Scores per (query, chunk, content version)
+    RERANK_CACHE_SIZE: int = 8192
+    RERANK_CACHE_TTL: int = 24 * 60 * 60
+    RERANK_CACHE_REDIS: bool = True
+
+    # Vector index (pgvector)
+    VECTOR_INDEX_TYPE: str = "hnsw"  # "hnsw" or "ivfflat"
+    HNSW_M: int = 16
+    HNSW_EF_CONSTRUCTION: int = 64
+    HNSW_EF_SEARCH: int = 40
+    # "off", "strict_order" or "relaxed_order" (pgvector >= 0.8)
+    HNSW_ITERATIVE_SCAN: str = "relaxed_order"
+    IVFFLAT_LISTS: int = 100
+    IVFFLAT_PROBES: int = 10
+
 
 settings = Settings()  # type: ignore
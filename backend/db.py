@@ -1,5 +1,7 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from pgvector.asyncpg import register_vector
 from config import settings
 
 DATABASE_URL = (
@@ -14,30 +16,289 @@ engine = create_engine(DATABASE_URL, echo=False)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ASYNC_DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=False,
+    pool_size=settings.ASYNC_DB_POOL_SIZE,
+    max_overflow=settings.ASYNC_DB_MAX_OVERFLOW,
+)
+
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def register_vector_codec(dbapi_connection, connection_record):
+    dbapi_connection.run_async(register_vector)
+
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
+VECTOR_INDEXES = {
+    "hnsw": (
+        "ix_chunks_embedding_hnsw",
+        "USING hnsw (embedding vector_cosine_ops) "
+        "WITH (m = {m}, ef_construction = {ef_construction})",
+    ),
+    "ivfflat": (
+        "ix_chunks_embedding_ivfflat",
+        "USING ivfflat (embedding vector_cosine_ops) WITH (lists = {lists})",
+    ),
+}
+
+
+def create_vector_indexes(conn):
+    index_type = settings.VECTOR_INDEX_TYPE.lower()
+    if index_type not in VECTOR_INDEXES:
+        raise ValueError(f"Unsupported VECTOR_INDEX_TYPE: {index_type}")
+
+    conn.execute(
+        text("CREATE INDEX IF NOT EXISTS ix_chunks_project_id ON chunks (project_id)")
+    )
+    conn.execute(
+        text("CREATE INDEX IF NOT EXISTS ix_chunks_document_id ON chunks (document_id)")
+    )
+
+    # Only one ANN index is kept on chunks.embedding, switching
+    # VECTOR_INDEX_TYPE drops the other one.
+    for name, (index_name, _) in VECTOR_INDEXES.items():
+        if name != index_type:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+
+    index_name, using = VECTOR_INDEXES[index_type]
+    using = using.format(
+        m=settings.HNSW_M,
+        ef_construction=settings.HNSW_EF_CONSTRUCTION,
+        lists=settings.IVFFLAT_LISTS,
+    )
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON chunks {using}"))
+
+
+ADDED_COLUMNS = [
+    ("documents", "processing_started_at TIMESTAMP"),
+    ("documents", "parsed_at TIMESTAMP"),
+    ("documents", "completed_at TIMESTAMP"),
+    ("documents", "stage_durations JSONB"),
+    ("chunks", "content_hash VARCHAR"),
+    ("chunks", "search_length INTEGER"),
+]
+
+
+SEARCH_FUNCTIONS = [
+    # Text indexed for a chunk: image chunks add their summary.
+    """
+    CREATE OR REPLACE FUNCTION chunks_search_text(
+        content TEXT, summarised_content TEXT, has_image BOOLEAN
+    ) RETURNS TEXT AS $$
+        SELECT CASE
+            WHEN has_image THEN
+                coalesce(content, '') || ' ' || coalesce(summarised_content, '')
+            ELSE
+                coalesce(content, '')
+        END
+    $$ LANGUAGE sql IMMUTABLE
+    """,
+    # Token count of a tsvector (repeated terms count once per position).
+    """
+    CREATE OR REPLACE FUNCTION search_vector_length(search_vector TSVECTOR)
+    RETURNS INTEGER AS $$
+        SELECT coalesce(sum(coalesce(array_length(positions, 1), 1)), 0)::INTEGER
+        FROM unnest(search_vector)
+    $$ LANGUAGE sql IMMUTABLE
+    """,
+    # Row trigger: only re-run to_tsvector when the indexed text changed,
+    # not on status/embedding updates.
+    """
+    CREATE OR REPLACE FUNCTION chunks_search_vector_update()
+    RETURNS TRIGGER AS $$
+    DECLARE
+        search_text TEXT;
+    BEGIN
+        search_text := chunks_search_text(
+            NEW.content, NEW.summarised_content, NEW.has_image
+        );
+
+        IF TG_OP = 'UPDATE' THEN
+            IF OLD.search_vector IS NOT NULL
+                AND search_text IS NOT DISTINCT FROM chunks_search_text(
+                    OLD.content, OLD.summarised_content, OLD.has_image
+                )
+            THEN
+                RETURN NEW;
+            END IF;
+        END IF;
+
+        NEW.search_vector := to_tsvector('english', search_text);
+        NEW.search_length := search_vector_length(NEW.search_vector);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    # Statement trigger: record the net change of a whole INSERT/UPDATE/DELETE
+    # to the per-project BM25 statistics. Deltas are only appended, so
+    # ingestion never locks the shared term rows; see utils/bm25.py.
+    """
+    CREATE OR REPLACE FUNCTION chunks_bm25_stats_update()
+    RETURNS TRIGGER AS $$
+    DECLARE
+        changes TEXT;
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            changes := 'SELECT project_id, search_vector, search_length, 1 AS sign
+                        FROM new_rows';
+        ELSIF TG_OP = 'DELETE' THEN
+            changes := 'SELECT project_id, search_vector, search_length, -1 AS sign
+                        FROM old_rows';
+        ELSE
+            changes := 'SELECT o.project_id, o.search_vector, o.search_length, -1 AS sign
+                        FROM old_rows o JOIN new_rows n ON n.id = o.id
+                        WHERE o.search_vector IS DISTINCT FROM n.search_vector
+                           OR o.project_id IS DISTINCT FROM n.project_id
+                        UNION ALL
+                        SELECT n.project_id, n.search_vector, n.search_length, 1
+                        FROM old_rows o JOIN new_rows n ON n.id = o.id
+                        WHERE o.search_vector IS DISTINCT FROM n.search_vector
+                           OR o.project_id IS DISTINCT FROM n.project_id';
+        END IF;
+
+        EXECUTE format($sql$
+            WITH changes AS (
+                SELECT * FROM (%s) c
+                WHERE c.project_id IS NOT NULL AND c.search_vector IS NOT NULL
+            ),
+            docs AS (
+                INSERT INTO project_bm25_deltas (project_id, doc_count, total_length)
+                SELECT project_id, sum(sign), coalesce(sum(sign * search_length), 0)
+                FROM changes
+                GROUP BY project_id
+            )
+            INSERT INTO project_term_deltas (project_id, term, doc_freq)
+            SELECT c.project_id, t.lexeme, sum(c.sign)
+            FROM changes c, unnest(c.search_vector) t
+            GROUP BY c.project_id, t.lexeme
+        $sql$, changes);
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+]
+
+# Transition tables need one trigger per event.
+SEARCH_TRIGGERS = [
+    """
+    CREATE TRIGGER chunks_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF content, summarised_content, has_image ON chunks
+    FOR EACH ROW EXECUTE FUNCTION chunks_search_vector_update()
+    """,
+    """
+    CREATE TRIGGER chunks_bm25_insert_trigger
+    AFTER INSERT ON chunks REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION chunks_bm25_stats_update()
+    """,
+    """
+    CREATE TRIGGER chunks_bm25_update_trigger
+    AFTER UPDATE ON chunks REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION chunks_bm25_stats_update()
+    """,
+    """
+    CREATE TRIGGER chunks_bm25_delete_trigger
+    AFTER DELETE ON chunks REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION chunks_bm25_stats_update()
+    """,
+]
+
+SEARCH_TRIGGER_NAMES = [
+    "chunks_search_vector_trigger",
+    "chunks_bm25_insert_trigger",
+    "chunks_bm25_update_trigger",
+    "chunks_bm25_delete_trigger",
+]
+
+
+def create_search_triggers(conn):
+    for function in SEARCH_FUNCTIONS:
+        conn.execute(text(function))
+
+    # Recreated every start so definition changes reach existing databases.
+    for name in SEARCH_TRIGGER_NAMES:
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {name} ON chunks"))
+    for trigger in SEARCH_TRIGGERS:
+        conn.execute(text(trigger))
+
+
+def needs_bm25_rebuild(conn) -> bool:
+    """True for chunks indexed before BM25 statistics were tracked."""
+    return conn.execute(
+        text("""
+            SELECT NOT EXISTS (SELECT 1 FROM project_bm25_stats)
+               AND NOT EXISTS (SELECT 1 FROM project_bm25_deltas)
+               AND EXISTS (SELECT 1 FROM chunks WHERE search_vector IS NOT NULL)
+        """)
+    ).scalar()
+
+
+def rebuild_bm25_stats(conn):
+    conn.execute(
+        text("""
+            UPDATE chunks SET search_length = search_vector_length(search_vector)
+            WHERE search_length IS NULL AND search_vector IS NOT NULL
+        """)
+    )
+    conn.execute(
+        text(
+            "TRUNCATE project_bm25_stats, project_term_stats, "
+            "project_bm25_deltas, project_term_deltas"
+        )
+    )
+    conn.execute(
+        text("""
+            INSERT INTO project_bm25_stats (project_id, doc_count, total_length)
+            SELECT project_id, count(*), coalesce(sum(search_length), 0)
+            FROM chunks
+            WHERE project_id IS NOT NULL AND search_vector IS NOT NULL
+            GROUP BY project_id
+        """)
+    )
+    conn.execute(
+        text("""
+            INSERT INTO project_term_stats (project_id, term, doc_freq)
+            SELECT c.project_id, t.lexeme, count(*)
+            FROM chunks c, unnest(c.search_vector) t
+            WHERE c.project_id IS NOT NULL
+            GROUP BY c.project_id, t.lexeme
+        """)
+    )
+
 
 def init_db():
     Base.metadata.create_all(bind=engine)
     print("Tables created")
 
+    # create_all() does not add columns to existing tables.
     with engine.connect() as conn:
-        conn.execute(
-            text("""
-            DO $$
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM pg_trigger WHERE tgname = 'chunks_search_vector_trigger'
-                ) THEN
-                    CREATE TRIGGER chunks_search_vector_trigger
-                    BEFORE INSERT OR UPDATE ON chunks
-                    FOR EACH ROW EXECUTE FUNCTION chunks_search_vector_update();
-                END IF;
-            END $$;
-        """)
-        )
+        for table, column in ADDED_COLUMNS:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column}"))
+        conn.commit()
+
+    with engine.connect() as conn:
+        create_search_triggers(conn)
+        conn.commit()
+    print("Triggers created")
+
+    with engine.connect() as conn:
+        if needs_bm25_rebuild(conn):
+            rebuild_bm25_stats(conn)
+            conn.commit()
+            print("BM25 statistics rebuilt")
+
+    with engine.connect() as conn:
+        create_vector_indexes(conn)
         conn.commit()
-    print("Trigger created")
+    print(f"Vector indexes created ({settings.VECTOR_INDEX_TYPE})")
 
 
 def get_db():
@@ -46,3 +307,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,6 +1,7 @@
 from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, Boolean
+from sqlalchemy import BigInteger
 from sqlalchemy import Index
-from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR, JSONB
 from sqlalchemy.orm import relationship, mapped_column
 from datetime import datetime
 import uuid
@@ -40,6 +41,9 @@ class Project(Base):
     messages = relationship(
         "Message", back_populates="project", cascade="all, delete-orphan"
     )
+    cached_answers = relationship(
+        "CachedAnswer", back_populates="project", cascade="all, delete-orphan"
+    )
 
 
 class Document(Base):
@@ -57,7 +61,15 @@ class Document(Base):
     chunks_summarized = Column(Integer, default=0)
     chunks_embedded = Column(Integer, default=0)
 
+    processing_started_at = Column(DateTime, nullable=True)
+    parsed_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    stage_durations = Column(JSONB, nullable=True)
+
     project = relationship("Project", back_populates="documents")
+    batch_jobs = relationship(
+        "BatchJob", back_populates="document", cascade="all, delete-orphan"
+    )
     chunks = relationship(
         "Chunk",
         back_populates="document",
@@ -75,23 +87,114 @@ class Chunk(Base):
     summarised_content = Column(String, nullable=True)
     embedding = mapped_column(VECTOR(384))
     search_vector = Column(TSVECTOR, nullable=True)
+    # Token count of search_vector, the BM25 document length
+    search_length = Column(Integer, nullable=True)
     has_text = Column(Boolean, nullable=True)
     has_image = Column(Boolean, nullable=True)
     has_table = Column(Boolean, nullable=True)
     page_number = Column(Integer, nullable=False)
+    content_hash = Column(String, nullable=True)
 
-    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"))
-    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"))
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), index=True)
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     document = relationship("Document", back_populates="chunks")
     images = relationship("Image", back_populates="chunk", cascade="all, delete-orphan")
+    artifact = relationship(
+        "ChunkArtifact",
+        primaryjoin="foreign(Chunk.content_hash) == ChunkArtifact.content_hash",
+        viewonly=True,
+    )
 
     __table_args__ = (
         Index("ix_chunks_search_vector", "search_vector", postgresql_using="gin"),
     )
 
 
+class BatchJob(Base):
+    """A provider batch job carrying part of a document's bulk ingestion."""
+
+    __tablename__ = "batch_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    kind = Column(String, nullable=False)  # "summary" or "embedding"
+    backend = Column(String, nullable=False)
+    provider_job_id = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="submitted")
+    request_count = Column(Integer, nullable=False)
+
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+
+    document = relationship("Document", back_populates="batch_jobs")
+
+
+class ChunkArtifact(Base):
+    """Summary and embedding shared by every chunk with the same content hash.
+
+    The hash already covers the summary and embedding model settings, so
+    identical pages in different projects resolve to the same row.
+    """
+
+    __tablename__ = "chunk_artifacts"
+
+    content_hash = Column(String, primary_key=True)
+    summary = Column(String, nullable=True)
+    embedding = mapped_column(VECTOR(384), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ProjectBM25Stats(Base):
+    """Per-project corpus size for BM25, folded in from ProjectBM25Delta."""
+
+    __tablename__ = "project_bm25_stats"
+
+    project_id = Column(UUID(as_uuid=True), primary_key=True)
+    doc_count = Column(BigInteger, nullable=False, default=0)
+    total_length = Column(BigInteger, nullable=False, default=0)
+
+
+class ProjectTermStats(Base):
+    """Per-project document frequency of each lexeme, for BM25 idf.
+
+    Folded in from ProjectTermDelta by the rollup_bm25_stats task.
+    """
+
+    __tablename__ = "project_term_stats"
+
+    project_id = Column(UUID(as_uuid=True), primary_key=True)
+    term = Column(String, primary_key=True)
+    doc_freq = Column(BigInteger, nullable=False, default=0)
+
+
+class ProjectBM25Delta(Base):
+    """Change to ProjectBM25Stats from one chunks statement, not yet folded in."""
+
+    __tablename__ = "project_bm25_deltas"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    project_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    doc_count = Column(BigInteger, nullable=False)
+    total_length = Column(BigInteger, nullable=False)
+
+
+class ProjectTermDelta(Base):
+    """Change to ProjectTermStats from one chunks statement, not yet folded in."""
+
+    __tablename__ = "project_term_deltas"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    project_id = Column(UUID(as_uuid=True), nullable=False)
+    term = Column(String, nullable=False)
+    doc_freq = Column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        Index("ix_project_term_deltas_project_term", "project_id", "term"),
+    )
+
+
 class Image(Base):
     __tablename__ = "images"
 
@@ -138,3 +241,19 @@ class Citation(Base):
         "Message",
         back_populates="citations",
     )
+
+
+class CachedAnswer(Base):
+    __tablename__ = "cached_answers"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    query = Column(String, nullable=False)
+    query_embedding = mapped_column(VECTOR(384))
+    options = Column(String, nullable=False)
+    answer = Column(String, nullable=False)
+    citations = Column(JSONB, nullable=False, default=list)
+
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    project = relationship("Project", back_populates="cached_answers")
@@ -6,6 +6,8 @@ from sqlalchemy.orm import Session
 from uuid import UUID
 from security.jwt import get_current_active_user
 from utils.s3 import upload_files_to_s3, delete_file_from_s3
+from utils.answer_cache import invalidate_answer_cache
+from tasks.bm25_stats import rollup_bm25_stats
 
 route = APIRouter(prefix="/api/projects/{project_id}/documents", tags=["documents"])
 
@@ -100,6 +102,7 @@ async def create_documents(
     ]
 
     db.add_all(db_documents)
+    invalidate_answer_cache(db, project_id)
     db.commit()
 
     for doc in db_documents:
@@ -145,6 +148,7 @@ async def delete_document(
             print(f"Warning: Failed to delete file from S3: {str(e)}")
 
     db.delete(document)
+    invalidate_answer_cache(db, project_id)
     db.flush()
 
     remaining_docs = (
@@ -155,4 +159,5 @@ async def delete_document(
         project.status = "created"  # type: ignore
 
     db.commit()
+    rollup_bm25_stats.delay()
     return
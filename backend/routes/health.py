@@ -1,4 +1,6 @@
 from fastapi import APIRouter
+from utils.query_embedding import query_embedding_cache
+from utils.reranker import get_reranker, rerank_score_cache
 
 route = APIRouter(prefix="/api/health", tags=["health"])
 
@@ -8,6 +10,7 @@ TIMEOUT_SECONDS = 2.0
 @route.get("/")
 def health_check():
     gpu_status = "healthy"
+    reranker = get_reranker()
 
     overall_status = "healthy" if gpu_status == "healthy" else "degraded"
 
@@ -16,5 +19,13 @@ def health_check():
         "services": {
             "api": "healthy",
             "gpu_service": gpu_status,
+            "reranker": {
+                "backend": reranker.name,
+                "loaded": reranker.is_loaded(),
+            },
+        },
+        "caches": {
+            "query_embedding": query_embedding_cache.stats(),
+            "rerank_score": rerank_score_cache.stats(),
         },
     }
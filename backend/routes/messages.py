@@ -1,22 +1,35 @@
 import asyncio
+import time
 import traceback
+import uuid
 from fastapi import Depends, APIRouter, HTTPException, status
 from fastapi.responses import StreamingResponse
 from schemas import (
     MessageCreateRequest,
     MessageResponse,
     OpenAIResponse,
+    CitationResponse,
 )
-from db import get_db
+from db import get_db, get_async_db, AsyncSessionLocal
 from models import User, Project, Message, Chunk, Document, Citation
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
-from security.jwt import get_current_active_user
+from security.jwt import get_current_active_user, get_current_active_user_async
 import json
-from litellm import completion, embedding
-from sqlalchemy import func
-from utils.rrf import reciprocal_rank_fusion
-from utils.reranker import reranker
+from litellm import acompletion
+from sqlalchemy import func, select, update
+from config import settings
+from utils.fusion import fuse, from_pairs
+from utils.reranker import areranker
+from utils.retrieval import dense_search, sparse_search, hydrate_chunks
+from utils.query_embedding import embed_query
+from utils.answer_cache import (
+    answer_cache_options,
+    find_cached_answer,
+    store_cached_answer,
+)
+from utils.json_stream import StructuredStreamParser
 import logging
 
 logger = logging.getLogger(__name__)
@@ -49,18 +62,55 @@ def list_messages(
     )
 
 
+def citation_payload(citation: Citation) -> dict:
+    return CitationResponse(
+        id=citation.id,
+        document_name=citation.document_name,
+        page_number=citation.page_number,
+        message_id=citation.message_id,
+        total_pages=citation.total_pages,
+    ).model_dump(mode="json")
+
+
+async def replay_cached_answer(db: AsyncSession, project_id: UUID, cached):
+    assistant_message = Message(
+        id=uuid.uuid4(),
+        role="assistant",
+        content=cached.answer,
+        project_id=project_id,
+    )
+    citations = [
+        Citation(id=uuid.uuid4(), message_id=assistant_message.id, **c)
+        for c in cached.citations
+    ]
+
+    db.add(assistant_message)
+    db.add_all(citations)
+    await db.commit()
+
+    return citations
+
+
+async def cached_answer_stream(answer: str, citations: list[Citation]):
+    payload = [citation_payload(c) for c in citations]
+
+    yield f"data: {json.dumps({'content': answer})}\n\n"
+    yield f"data: {json.dumps({'citations': payload})}\n\n"
+    yield f"data: {json.dumps({'done': True})}\n\n"
+
+
 @route.post("/")
-def create_message(
+async def create_message(
     project_id: UUID,
     message: MessageCreateRequest,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
     logger.info(f"Message: {message}")
-    project = (
-        db.query(Project)
-        .filter(Project.user_id == current_user.id, Project.id == project_id)
-        .first()
+    project = await db.scalar(
+        select(Project).where(
+            Project.user_id == current_user.id, Project.id == project_id
+        )
     )
 
     if not project:
@@ -75,49 +125,59 @@ def create_message(
     )
 
     db.add(user_message)
-    db.commit()
-    db.refresh(user_message)
+    await db.commit()
 
-    embed_resp = embedding(
-        model="text-embedding-3-small", input=message.content, dimensions=384
-    )
+    message_embedding = await embed_query(message.content)
 
-    message_embedding = embed_resp.data[0]["embedding"]
+    cache_options = answer_cache_options(message)
 
-    candidates = (
-        db.query(Chunk)
-        .filter(Chunk.project_id == project_id)
-        .order_by(Chunk.embedding.cosine_distance(message_embedding))
-        .limit(20)
-        .all()
-    )
+    if message.answer_cache:
+        cached = await find_cached_answer(
+            db, project_id, message_embedding, cache_options
+        )
 
-    logger.info(f"Vector Retrieved Chunks: {len(candidates)}")
+        if cached:
+            logger.info(f"Answer cache hit for project {project_id}")
+            citations = await replay_cached_answer(db, project_id, cached)
+            return StreamingResponse(
+                cached_answer_stream(cached.answer, citations),
+                media_type="text/event-stream",
+            )
 
     if message.hybrid_search:
-        ts_query = func.plainto_tsquery("english", message.content)
-
-        bm25_candidates = (
-            db.query(Chunk)
-            .filter(Chunk.project_id == project_id)
-            .filter(Chunk.search_vector.op("@@")(ts_query))
-            .order_by(func.ts_rank_cd(Chunk.search_vector, ts_query).desc())
-            .limit(20)
-            .all()
-        )
+        start = time.perf_counter()
 
-        logger.info(f"BM25 Retrieved Chunks: {len(bm25_candidates)}")
+        dense_results, sparse_results = await asyncio.gather(
+            dense_search(
+                project_id, message_embedding, 20, message.ef_search, message.probes
+            ),
+            sparse_search(project_id, message.content, 20),
+        )
 
-        candidates = reciprocal_rank_fusion([candidates, bm25_candidates])
+        duration_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"Hybrid retrieval finished in {duration_ms:.2f} ms")
 
-        logger.info(f"RRF Merged Chunks: {len(candidates)}")
+        ranked_ids, _ = fuse(
+            [from_pairs(dense_results), from_pairs(sparse_results)],
+            method=settings.FUSION_METHOD,
+            weights=[settings.FUSION_DENSE_WEIGHT, settings.FUSION_SPARSE_WEIGHT],
+            k=settings.RRF_K,
+            normalization=settings.FUSION_NORMALIZATION,
+        )
 
-    candidates = candidates[:10]
+        logger.info(f"{settings.FUSION_METHOD} Merged Chunks: {len(ranked_ids)}")
+    else:
+        dense_results = await dense_search(
+            project_id, message_embedding, 20, message.ef_search, message.probes
+        )
+        ranked_ids = [chunk_id for chunk_id, _ in dense_results]
 
+    # Only the chunks that can still reach the prompt are loaded.
     if message.reranking:
-        candidates = reranker(message.content, candidates)
+        candidates = await hydrate_chunks(ranked_ids[:10])
+        candidates = await areranker(message.content, candidates)
     else:
-        candidates = candidates[:3]
+        candidates = await hydrate_chunks(ranked_ids[:3])
 
     logger.info(f"Chunks after Reranking: {len(candidates)}")
 
@@ -145,74 +205,106 @@ def create_message(
     )
 
     db.add(assistant_message)
-    db.commit()
-    db.refresh(assistant_message)
+    await db.commit()
 
-    async def stream():
-        try:
-            response = completion(
-                model="gpt-5-nano",
-                max_tokens=2000,
-                reasoning_effort="low",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """
-                            Answer using ONLY the provided context chunks.
-
-                            Rules:
-                            - Cite ONLY the chunk numbers you actually used.
-                            - Every factual claim must be supported by a cited chunk.
-                            - Do NOT guess or default to chunk 1.
-                            - If the answer is not supported by the context, respond "I don't know".
-                        """,
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                response_format=OpenAIResponse,
-                stream=False,
-            )
+    async def save_citations(session: AsyncSession, citations):
+        saved = []
 
-            response_json = OpenAIResponse.model_validate_json(
-                response.choices[0].message.content
-            )
+        for chunk_index in citations:
+            if isinstance(chunk_index, int) and 1 <= chunk_index <= len(candidates):
+                chunk = candidates[chunk_index - 1]
+                document = await session.get(Document, chunk.document_id)
 
-            answer_text = response_json.answer
-            citations = response_json.citations
-
-            for char in answer_text:
-                yield f"data: {json.dumps({'content': char})}\n\n"
-                await asyncio.sleep(0.01)
+                if document:
+                    total_pages = await session.scalar(
+                        select(func.count(Chunk.id)).where(
+                            Chunk.document_id == document.id
+                        )
+                    )
+                    citation_entry = Citation(
+                        document_name=document.filename,
+                        document_s3_key=document.s3_key,
+                        page_number=chunk.page_number,
+                        message_id=assistant_message.id,
+                        total_pages=total_pages,
+                    )
+                    session.add(citation_entry)
+                    saved.append(citation_entry)
 
-            assistant_message.content = answer_text
+        await session.flush()
+        return saved
 
-            for chunk_index in citations:
-                if isinstance(chunk_index, int) and 1 <= chunk_index <= len(candidates):
-                    chunk = candidates[chunk_index - 1]
-                    document = (
-                        db.query(Document)
-                        .filter(Document.id == chunk.document_id)
-                        .first()
+    async def stream():
+        # The request-scoped session may be closed before the response
+        # finishes streaming, so the stream persists through its own.
+        async with AsyncSessionLocal() as session:
+            try:
+                response = await acompletion(
+                    model="gpt-5-nano",
+                    max_tokens=2000,
+                    reasoning_effort="low",
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": """
+                                Answer using ONLY the provided context chunks.
+
+                                Rules:
+                                - Cite ONLY the chunk numbers you actually used.
+                                - Every factual claim must be supported by a cited chunk.
+                                - Do NOT guess or default to chunk 1.
+                                - If the answer is not supported by the context, respond "I don't know".
+                            """,
+                        },
+                        {"role": "user", "content": prompt},
+                    ],
+                    response_format=OpenAIResponse,
+                    stream=True,
+                )
+
+                parser = StructuredStreamParser(stream_fields={"answer"})
+                citations = []
+
+                async for part in response:
+                    delta = part.choices[0].delta.content
+                    if not delta:
+                        continue
+
+                    for event, key, value in parser.feed(delta):
+                        if event == "delta":
+                            yield f"data: {json.dumps({'content': value})}\n\n"
+                        elif key == "citations":
+                            citations = await save_citations(session, value)
+                            payload = [citation_payload(c) for c in citations]
+                            yield f"data: {json.dumps({'citations': payload})}\n\n"
+
+                response_json = OpenAIResponse.model_validate(parser.result)
+
+                await session.execute(
+                    update(Message)
+                    .where(Message.id == assistant_message.id)
+                    .values(content=response_json.answer)
+                )
+
+                if message.answer_cache and citations:
+                    store_cached_answer(
+                        session,
+                        project_id,
+                        message.content,
+                        message_embedding,
+                        cache_options,
+                        response_json.answer,
+                        citations,
                     )
 
-                    if document:
-                        citation_entry = Citation(
-                            document_name=document.filename,
-                            document_s3_key=document.s3_key,
-                            page_number=chunk.page_number,
-                            message_id=assistant_message.id,
-                            total_pages=len(document.chunks),
-                        )
-                        db.add(citation_entry)
-
-            db.commit()
-            db.refresh(assistant_message)
+                await session.commit()
 
-            yield f"data: {json.dumps({'done': True})}\n\n"
+                yield f"data: {json.dumps({'done': True})}\n\n"
 
-        except Exception as e:
-            print(f"Error in stream: {traceback.format_exc()}")
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            except Exception as e:
+                await session.rollback()
+                print(f"Error in stream: {traceback.format_exc()}")
+                yield f"data: {json.dumps({'error': str(e)})}\n\n"
 
     return StreamingResponse(
         stream(),
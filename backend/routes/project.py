@@ -11,6 +11,7 @@ from sqlalchemy.orm import Session
 from uuid import UUID
 from security.jwt import get_current_active_user
 from tasks.process_document import process_document
+from tasks.bm25_stats import rollup_bm25_stats
 from utils.s3 import delete_folder_from_s3
 
 route = APIRouter(prefix="/api/projects", tags=["projects"])
@@ -178,4 +179,5 @@ def delete_project(
     delete_folder_from_s3(str(project.user_id), str(project.id))
     db.delete(project)
     db.commit()
+    rollup_bm25_stats.delay()
     return
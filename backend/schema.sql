@@ -1,16 +1,18 @@
 CREATE EXTENSION vector;
 
-CREATE OR REPLACE FUNCTION chunks_search_vector_update()
-RETURNS TRIGGER AS $$
+-- Full-text search and BM25 statistics triggers on chunks are created by
+-- init_db() (see SEARCH_FUNCTIONS in db.py).
+
+-- ANN / filter indexes on chunks. The table itself is created by init_db(),
+-- which also (re)creates these according to VECTOR_INDEX_TYPE; this block
+-- only applies when the script is run against an existing database.
+DO $$
 BEGIN
-    NEW.search_vector = to_tsvector('english',
-        CASE
-            WHEN NEW.has_image THEN
-                coalesce(NEW.content, '') || ' ' || coalesce(NEW.summarised_content, '')
-            ELSE
-                coalesce(NEW.content, '')
-        END
-    );
-    RETURN NEW;
-END;
-$$ LANGUAGE plpgsql;
\ No newline at end of file
+    IF to_regclass('public.chunks') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS ix_chunks_project_id ON chunks (project_id);
+        CREATE INDEX IF NOT EXISTS ix_chunks_document_id ON chunks (document_id);
+        CREATE INDEX IF NOT EXISTS ix_chunks_embedding_hnsw ON chunks
+            USING hnsw (embedding vector_cosine_ops)
+            WITH (m = 16, ef_construction = 64);
+    END IF;
+END $$;
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, ConfigDict
+from pydantic import BaseModel, EmailStr, ConfigDict, Field
 from uuid import UUID
 from datetime import datetime
 from typing import List
@@ -31,6 +31,9 @@ class MessageCreateRequest(BaseModel):
     hybrid_search: bool | None = False
     graph_search: bool | None = False
     reranking: bool | None = False
+    answer_cache: bool | None = False
+    ef_search: int | None = Field(default=None, ge=1, le=1000)
+    probes: int | None = Field(default=None, ge=1, le=1000)
 
     model_config = ConfigDict(
         alias_generator=to_camel,
@@ -84,6 +87,7 @@ class DocumentProgressResponse(BaseModel):
     total_chunks: int | None
     chunks_summarized: int
     chunks_embedded: int
+    stage_durations: dict | None = None
 
     class Config:
         from_attributes = True
@@ -145,3 +149,12 @@ class CitationViewResponse(BaseModel):
 class OpenAIResponse(BaseModel):
     answer: str
     citations: List[int]
+
+
+class ChunkSummary(BaseModel):
+    page_id: int
+    summary: str
+
+
+class ChunkSummariesResponse(BaseModel):
+    summaries: List[ChunkSummary]
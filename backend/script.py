@@ -8,6 +8,7 @@ from routes.auth import route as login_route
 from routes.messages import route as messages_route
 from routes.citation import route as citation_route
 from fastapi.middleware.cors import CORSMiddleware
+from utils.reranker import get_reranker
 
 import logging
 
@@ -36,6 +37,16 @@ def on_startup():
     init_db()
 
 
+@app.on_event("startup")
+async def load_reranker():
+    await get_reranker().load()
+
+
+@app.on_event("shutdown")
+async def unload_reranker():
+    await get_reranker().unload()
+
+
 app.include_router(health_route)
 app.include_router(login_route)
 app.include_router(user_route)
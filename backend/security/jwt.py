@@ -2,9 +2,11 @@ from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime, timedelta, timezone
 import jwt
 from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
-from db import get_db
+from db import get_db, get_async_db
 from models import User
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends, HTTPException, status
 from config import settings
 
@@ -23,9 +25,7 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-):
+def get_username_from_token(token: str):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -47,13 +47,38 @@ async def get_current_user(
     except InvalidTokenError:
         raise credentials_exception
 
+    return username, credentials_exception
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+):
+    username, credentials_exception = get_username_from_token(token)
+
     user = db.query(User).filter(User.email == username).first()
     if user is None:
         raise credentials_exception
     return user
 
 
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
+):
+    username, credentials_exception = get_username_from_token(token)
+
+    user = await db.scalar(select(User).where(User.email == username))
+    if user is None:
+        raise credentials_exception
+    return user
+
+
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
     # if current_user.disabled:
     #     raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+
+async def get_current_active_user_async(
+    current_user: User = Depends(get_current_user_async),
+):
+    return current_user
@@ -0,0 +1,29 @@
+from celery_app import celery_app
+from db import SessionLocal
+from utils.bm25 import fold_bm25_deltas
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=10,
+    retry_kwargs={"max_retries": 3},
+)
+def rollup_bm25_stats(self):
+    db = SessionLocal()
+
+    try:
+        projects = fold_bm25_deltas(db)
+        logger.info(f"Rolled up BM25 statistics for {projects} projects")
+
+        return {"status": "done", "projects": projects}
+
+    except:
+        db.rollback()
+        raise
+
+    finally:
+        db.close()
@@ -0,0 +1,371 @@
+from celery import group
+from celery.exceptions import Retry
+from celery_app import celery_app
+from config import settings
+from db import SessionLocal
+from models import BatchJob, Chunk, Image
+from uuid import UUID
+from datetime import datetime
+from collections import defaultdict
+from sqlalchemy import update
+from utils.s3 import get_presigned_urls_for_chunk_images
+from utils.batch_jobs import (
+    CHAT_COMPLETIONS_ENDPOINT,
+    EMBEDDINGS_ENDPOINT,
+    batch_request,
+    get_batch_backend,
+)
+from utils.chunk_artifacts import get_chunk_artifact, store_artifact_summary
+from utils.progress import increment_document_progress, claim_document_completion
+from tasks.embed_chunks import enqueue_for_embedding, write_embeddings
+from tasks.finalize_document import finalize_document
+from tasks.process_chunk import (
+    SUMMARY_PROMPT,
+    chunk_message_content,
+    apply_summary,
+    process_chunk,
+    reuse_artifact,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Batch jobs may sit in the provider queue for up to a day; the image links
+# in summary requests must outlive that (7 days is the SigV4 maximum).
+BATCH_IMAGE_URL_EXPIRY = 7 * 24 * 60 * 60
+
+
+def embedding_text(chunk) -> str:
+    """What online ingestion embeds: the image summary, else the page text."""
+    if chunk.has_image and chunk.artifact is not None and chunk.artifact.summary:
+        return chunk.artifact.summary
+    return chunk.content
+
+
+def summary_request(chunk, images) -> dict:
+    image_urls = get_presigned_urls_for_chunk_images(
+        images=images, expires_in=BATCH_IMAGE_URL_EXPIRY
+    )
+
+    return batch_request(
+        str(chunk.id),
+        CHAT_COMPLETIONS_ENDPOINT,
+        {
+            "model": settings.SUMMARY_MODEL,
+            "max_completion_tokens": 2000,
+            "reasoning_effort": "low",
+            "messages": [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": chunk_message_content(chunk, image_urls)},
+            ],
+        },
+    )
+
+
+def embedding_request(chunk_id, text: str) -> dict:
+    return batch_request(
+        str(chunk_id),
+        EMBEDDINGS_ENDPOINT,
+        {
+            "model": settings.EMBEDDING_MODEL,
+            "input": text,
+            "dimensions": settings.EMBEDDING_DIMENSIONS,
+        },
+    )
+
+
+def submit_batch_jobs(db, document_id, kind: str, requests: list[dict]):
+    """Submit requests as one or more jobs and schedule polling for each."""
+    backend = get_batch_backend()
+    endpoint = EMBEDDINGS_ENDPOINT if kind == "embedding" else CHAT_COMPLETIONS_ENDPOINT
+    jobs = []
+
+    for i in range(0, len(requests), settings.BATCH_MAX_REQUESTS):
+        part = requests[i : i + settings.BATCH_MAX_REQUESTS]
+        job = BatchJob(
+            document_id=document_id,
+            kind=kind,
+            backend=backend.name,
+            provider_job_id=backend.submit(part, endpoint),
+            request_count=len(part),
+        )
+        db.add(job)
+        jobs.append(job)
+
+    db.commit()
+
+    for job in jobs:
+        logger.info(
+            f"Submitted {kind} batch {job.provider_job_id} "
+            f"({job.request_count} requests) for document {document_id}"
+        )
+        poll_batch_job.apply_async(
+            args=[str(job.id)], countdown=settings.BATCH_POLL_INTERVAL
+        )
+
+
+@celery_app.task(
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=10,
+    retry_kwargs={"max_retries": 3},
+)
+def submit_bulk_document(self, document_id: str):
+    """Bulk counterpart of dispatching process_chunk for a document's new chunks."""
+    db = SessionLocal()
+
+    try:
+        doc_uuid = UUID(document_id)
+
+        chunks = (
+            db.query(Chunk)
+            .filter(Chunk.document_id == doc_uuid)
+            .filter(Chunk.status == "created")
+            .all()
+        )
+
+        images_by_chunk = defaultdict(list)
+        for image in db.query(Image).filter(Image.chunk_id.in_([c.id for c in chunks])):
+            images_by_chunk[image.chunk_id].append(image)
+
+        summary_requests = []
+        embedding_requests = []
+        reused = 0
+
+        for chunk in chunks:
+            artifact = get_chunk_artifact(db, chunk.content_hash)
+
+            if artifact is not None and artifact.embedding is not None:
+                reuse_artifact(db, chunk, artifact)
+                reused += 1
+            elif images_by_chunk[chunk.id] and not (artifact and artifact.summary):
+                summary_requests.append(
+                    summary_request(chunk, images_by_chunk[chunk.id])
+                )
+            else:
+                summary = artifact.summary if images_by_chunk[chunk.id] else None
+                text = apply_summary(db, chunk, summary)
+                embedding_requests.append(embedding_request(chunk.id, text))
+
+        db.commit()
+
+        if summary_requests:
+            submit_batch_jobs(db, doc_uuid, "summary", summary_requests)
+        if embedding_requests:
+            submit_batch_jobs(db, doc_uuid, "embedding", embedding_requests)
+
+        if reused and claim_document_completion(db, doc_uuid):
+            finalize_document.delay(document_id)
+
+        return {
+            "status": "submitted",
+            "summaries": len(summary_requests),
+            "embeddings": len(embedding_requests),
+            "reused": reused,
+        }
+
+    except:
+        db.rollback()
+        raise
+
+    finally:
+        db.close()
+
+
+def apply_summary_results(db, job, results: list[dict]):
+    """Store a summary job's results and submit their embedding job.
+
+    Safe to re-run: the summaries are committed with the job marked
+    "applied", and the embedding job covers every chunk of this job still
+    waiting for one, so a retry after a failed submit picks up from there.
+    """
+    summaries = {
+        UUID(r["custom_id"]): r["body"]["choices"][0]["message"]["content"]
+        for r in results
+        if r["error"] is None
+    }
+    failed = [r["custom_id"] for r in results if r["error"] is not None]
+
+    if job.status == "submitted":
+        chunks = (
+            db.query(Chunk)
+            .filter(Chunk.id.in_(list(summaries)))
+            .filter(Chunk.status == "created")
+            .all()
+        )
+
+        if chunks:
+            db.execute(
+                update(Chunk),
+                [
+                    {
+                        "id": chunk.id,
+                        "summarised_content": summaries[chunk.id]
+                        + "\n\n"
+                        + chunk.content,
+                        "status": "summarized",
+                    }
+                    for chunk in chunks
+                ],
+            )
+            for chunk in chunks:
+                store_artifact_summary(db, chunk.content_hash, summaries[chunk.id])
+            increment_document_progress(db, job.document_id, summarized=len(chunks))
+
+        job.status = "applied"
+        db.commit()
+
+    pending_ids = [
+        row.id
+        for row in db.query(Chunk.id)
+        .filter(Chunk.id.in_(list(summaries)))
+        .filter(Chunk.status == "summarized")
+    ]
+
+    # Committed together with the embedding job rows.
+    job.status = "completed"
+    job.completed_at = datetime.utcnow()
+
+    if pending_ids:
+        submit_batch_jobs(
+            db,
+            job.document_id,
+            "embedding",
+            [
+                embedding_request(chunk_id, summaries[chunk_id])
+                for chunk_id in pending_ids
+            ],
+        )
+    else:
+        db.commit()
+
+    # Whatever the batch rejected goes through the online path instead.
+    if failed:
+        group(process_chunk.s(chunk_id) for chunk_id in failed).apply_async()
+
+
+def apply_embedding_results(db, job, results: list[dict]):
+    vectors = {
+        r["custom_id"]: r["body"]["data"][0]["embedding"]
+        for r in results
+        if r["error"] is None
+    }
+    # Skips chunks already embedded, so re-applying after an error is safe.
+    write_embeddings(db, vectors)
+
+    job.status = "completed"
+    job.completed_at = datetime.utcnow()
+    db.commit()
+
+    failed = [UUID(r["custom_id"]) for r in results if r["error"] is not None]
+    for chunk in db.query(Chunk).filter(Chunk.id.in_(failed)):
+        enqueue_for_embedding(chunk.id, embedding_text(chunk))
+
+
+def fall_back_online(db, job):
+    """Send the chunks a failed job was carrying through online ingestion."""
+    status = "created" if job.kind == "summary" else "summarized"
+    chunks = (
+        db.query(Chunk)
+        .filter(Chunk.document_id == job.document_id)
+        .filter(Chunk.status == status)
+        .all()
+    )
+
+    # An applied summary job stored its summaries but never got to submit
+    # the embedding job.
+    summarized = []
+    if job.kind == "summary" and job.status == "applied":
+        summarized = (
+            db.query(Chunk)
+            .filter(Chunk.document_id == job.document_id)
+            .filter(Chunk.status == "summarized")
+            .all()
+        )
+
+    if job.kind == "summary":
+        group(process_chunk.s(str(chunk.id)) for chunk in chunks).apply_async()
+        to_embed = summarized
+    else:
+        to_embed = chunks
+
+    for chunk in to_embed:
+        enqueue_for_embedding(chunk.id, embedding_text(chunk))
+
+    return len(chunks) + len(summarized)
+
+
+@celery_app.task(bind=True, max_retries=None)
+def poll_batch_job(self, batch_job_id: str, errors: int = 0):
+    db = SessionLocal()
+
+    try:
+        job = db.query(BatchJob).filter(BatchJob.id == UUID(batch_job_id)).first()
+
+        # "applied": summaries stored, embedding job not submitted yet.
+        if not job or job.status not in ("submitted", "applied"):
+            return {"status": "skipped"}
+
+        backend = get_batch_backend()
+        status = backend.status(job.provider_job_id)
+
+        if status == "in_progress":
+            raise self.retry(
+                countdown=settings.BATCH_POLL_INTERVAL, kwargs={"errors": 0}
+            )
+
+        if status == "failed":
+            return fail_batch_job(db, job, "failed")
+
+        results = backend.results(job.provider_job_id)
+
+        if job.kind == "summary":
+            apply_summary_results(db, job, results)
+        else:
+            apply_embedding_results(db, job, results)
+
+        logger.info(
+            f"Applied {job.kind} batch {job.provider_job_id}: {len(results)} results"
+        )
+
+        return {"status": "completed", "results": len(results)}
+
+    except Retry:
+        raise
+
+    except Exception as e:
+        db.rollback()
+
+        # Provider and database errors are usually transient; keep polling
+        # so the job is not left "submitted" with nothing watching it.
+        if errors + 1 < settings.BATCH_POLL_MAX_ERRORS:
+            logger.warning(f"Polling batch job {batch_job_id} failed, retrying: {e}")
+            raise self.retry(
+                exc=e,
+                countdown=settings.BATCH_POLL_INTERVAL,
+                kwargs={"errors": errors + 1},
+            )
+
+        job = db.query(BatchJob).filter(BatchJob.id == UUID(batch_job_id)).first()
+        if job and job.status in ("submitted", "applied"):
+            fail_batch_job(db, job, "errored")
+        raise
+
+    finally:
+        db.close()
+
+
+def fail_batch_job(db, job, reason: str) -> dict:
+    # Hand the chunks over first; a crash in between leaves the job to be
+    # polled again rather than stranded.
+    count = fall_back_online(db, job)
+
+    job.status = "failed"
+    job.completed_at = datetime.utcnow()
+    db.commit()
+
+    logger.warning(
+        f"{job.kind} batch {job.provider_job_id} {reason}, "
+        f"{count} chunks sent to online ingestion"
+    )
+    return {"status": "failed", "fallback": count}
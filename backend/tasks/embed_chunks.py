@@ -0,0 +1,198 @@
+from celery_app import celery_app
+from config import settings
+from db import SessionLocal
+from models import Document, Chunk
+from uuid import UUID
+from sqlalchemy import update
+from collections import Counter
+from utils.redis_client import get_redis
+from utils.llm_client import get_llm_client
+from utils.progress import increment_document_progress, claim_document_completion
+from tasks.finalize_document import finalize_document
+from utils.chunk_artifacts import store_artifact_embeddings
+from utils.embedding_batcher import (
+    EmbeddingBatcher,
+    EmbeddingBatchError,
+    FakeEmbeddingProvider,
+    InMemoryEmbeddingQueue,
+    LiteLLMEmbeddingProvider,
+    RedisEmbeddingQueue,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SCHEDULED_KEY = "embedding:flush_scheduled"
+
+_batcher = None
+
+
+def get_embedding_queue():
+    if settings.EMBED_QUEUE == "redis":
+        return RedisEmbeddingQueue(get_redis(), lease_ttl=settings.EMBED_LEASE_TIMEOUT)
+    if settings.EMBED_QUEUE == "memory":
+        return InMemoryEmbeddingQueue(lease_ttl=settings.EMBED_LEASE_TIMEOUT)
+    raise ValueError(f"Unsupported EMBED_QUEUE: {settings.EMBED_QUEUE}")
+
+
+def get_embedding_provider():
+    if settings.EMBED_PROVIDER == "litellm":
+        return LiteLLMEmbeddingProvider(
+            settings.EMBEDDING_MODEL,
+            settings.EMBEDDING_DIMENSIONS,
+            client=get_llm_client(),
+        )
+    if settings.EMBED_PROVIDER == "fake":
+        return FakeEmbeddingProvider(settings.EMBEDDING_DIMENSIONS)
+    raise ValueError(f"Unsupported EMBED_PROVIDER: {settings.EMBED_PROVIDER}")
+
+
+def get_embedding_batcher():
+    global _batcher
+
+    if _batcher is None:
+        _batcher = EmbeddingBatcher(
+            queue=get_embedding_queue(),
+            provider=get_embedding_provider(),
+            max_batch_size=settings.EMBED_BATCH_SIZE,
+            max_batch_tokens=settings.EMBED_BATCH_MAX_TOKENS,
+        )
+
+    return _batcher
+
+
+def enqueue_for_embedding(chunk_id, text: str):
+    batcher = get_embedding_batcher()
+    batcher.submit(str(chunk_id), text)
+
+    schedule_flush(
+        0
+        if batcher.pending() >= settings.EMBED_BATCH_SIZE
+        else settings.EMBED_BATCH_TIMEOUT
+    )
+
+
+def schedule_flush(countdown: float):
+    # A process-local queue has no other workers to coordinate with.
+    if settings.EMBED_QUEUE == "memory":
+        embed_chunks.apply_async(countdown=countdown)
+        return
+
+    # One pending flush at a time; it drains everything queued by then.
+    if get_redis().set(FLUSH_SCHEDULED_KEY, 1, nx=True, ex=60):
+        embed_chunks.apply_async(countdown=countdown)
+
+
+def write_embeddings(db, vectors: dict[str, list[float]]):
+    if not vectors:
+        return
+
+    # Claim the status transition first: when the same chunk is flushed
+    # twice (an expired lease, a bulk fallback), the second writer waits on
+    # the row lock, then no longer matches, so nothing is counted twice.
+    rows = db.execute(
+        update(Chunk)
+        .where(Chunk.id.in_([UUID(c) for c in vectors]))
+        .where(Chunk.status != "embedded")
+        .values(status="embedded")
+        .returning(Chunk.id, Chunk.document_id, Chunk.content_hash)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+    if not rows:
+        db.commit()
+        return
+
+    db.execute(
+        update(Chunk),
+        [{"id": row.id, "embedding": vectors[str(row.id)]} for row in rows],
+    )
+
+    # Later copies of the same page, in any project, skip the API call.
+    store_artifact_embeddings(
+        db,
+        {
+            row.content_hash: vectors[str(row.id)]
+            for row in rows
+            if row.content_hash is not None
+        },
+    )
+
+    # Sorted so concurrent flushes update document rows in the same order.
+    counts = sorted(Counter(row.document_id for row in rows).items())
+    for document_id, count in counts:
+        increment_document_progress(db, document_id, embedded=count)
+
+    db.commit()
+
+    for document_id, _ in counts:
+        if claim_document_completion(db, document_id):
+            finalize_document.delay(str(document_id))
+
+
+def mark_chunks_failed(db, chunk_ids: list[str]):
+    chunks = db.query(Chunk).filter(Chunk.id.in_([UUID(c) for c in chunk_ids])).all()
+
+    for chunk in chunks:
+        chunk.status = "failed"
+
+    for document in (
+        db.query(Document)
+        .filter(Document.id.in_({c.document_id for c in chunks}))
+        .all()
+    ):
+        document.status = "failed"
+
+    db.commit()
+
+
+@celery_app.task(bind=True, max_retries=3)
+def embed_chunks(self):
+    if settings.EMBED_QUEUE == "redis":
+        get_redis().delete(FLUSH_SCHEDULED_KEY)
+
+    batcher = get_embedding_batcher()
+    db = SessionLocal()
+
+    recovered = batcher.queue.recover()
+    if recovered:
+        logger.warning(f"Requeued {recovered} embedding inputs with expired leases")
+
+    try:
+        while batcher.pending():
+            items = batcher.take()
+
+            try:
+                vectors = batcher.flush(items)
+            except EmbeddingBatchError as e:
+                write_embeddings(db, e.results)
+
+                if self.request.retries < self.max_retries:
+                    batcher.queue.requeue(e.failed)
+                    batcher.ack(items)
+                    raise self.retry(exc=e, countdown=10 * 2**self.request.retries)
+
+                mark_chunks_failed(db, [item["chunk_id"] for item in e.failed])
+                batcher.ack(items)
+                raise
+
+            # Only acknowledged once committed; a crash before this leaves
+            # the inputs leased, and they are recovered after the lease ends.
+            write_embeddings(db, vectors)
+            batcher.ack(items)
+            logger.info(f"Embedded batch of {len(vectors)} chunks")
+
+        return {"status": "done"}
+
+    except:
+        db.rollback()
+        raise
+
+    finally:
+        db.close()
+
+        # Inputs still leased (this run failed to store them, or an earlier
+        # worker died) need a flush after their lease expires. A local queue
+        # recovers them on its next flush instead.
+        if settings.EMBED_QUEUE == "redis" and batcher.queue.in_flight():
+            schedule_flush(settings.EMBED_LEASE_TIMEOUT)
@@ -0,0 +1,73 @@
+from celery_app import celery_app
+from db import SessionLocal
+from models import Document
+from uuid import UUID
+from utils.answer_cache import invalidate_answer_cache
+from utils.progress import mark_project_ready_if_complete
+from tasks.bm25_stats import rollup_bm25_stats
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def elapsed_ms(start, end):
+    if start is None or end is None:
+        return None
+    return (end - start).total_seconds() * 1000
+
+
+@celery_app.task(
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=10,
+    retry_kwargs={"max_retries": 3},
+)
+def finalize_document(self, document_id: str):
+    """Runs once per ingestion, after the last chunk of a document is embedded."""
+    db = SessionLocal()
+
+    try:
+        doc_uuid = UUID(document_id)
+
+        document = (
+            db.query(Document).filter(Document.id == doc_uuid).with_for_update().first()
+        )
+
+        if not document:
+            return {"status": "error", "message": "Document not found"}
+
+        if document.status != "processing":
+            return {"status": "skipped", "document_status": document.status}
+
+        # parse_ms and first_queued_ms are recorded by process_document.
+        durations = dict(document.stage_durations or {})
+        durations["after_parse_ms"] = elapsed_ms(
+            document.parsed_at, document.completed_at
+        )
+        durations["total_ms"] = elapsed_ms(
+            document.processing_started_at, document.completed_at
+        )
+
+        project_id = document.project_id
+        total_chunks = document.total_chunks
+
+        document.status = "ready"
+        document.stage_durations = durations
+        invalidate_answer_cache(db, project_id)
+        db.commit()
+
+        project_ready = mark_project_ready_if_complete(db, project_id)
+        rollup_bm25_stats.delay()
+
+        logger.info(
+            f"Document {document_id} ready: {total_chunks} chunks, stages {durations}"
+        )
+
+        return {"status": "ready", "project_ready": project_ready}
+
+    except:
+        db.rollback()
+        raise
+
+    finally:
+        db.close()
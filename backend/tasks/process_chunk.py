@@ -1,9 +1,154 @@
 from celery_app import celery_app
+from config import settings
 from db import SessionLocal
-from models import Document, Chunk, Project, Image
+from models import Chunk, Image
 from uuid import UUID
+from collections import defaultdict
+from pydantic import ValidationError
+from schemas import ChunkSummariesResponse
 from utils.s3 import get_presigned_urls_for_chunk_images
-from litellm import embedding, completion
+from utils.llm_client import get_llm_client
+from tasks.embed_chunks import enqueue_for_embedding, mark_chunks_failed
+from tasks.finalize_document import finalize_document
+from utils.progress import increment_document_progress, claim_document_completion
+from utils.chunk_artifacts import get_chunk_artifact, store_artifact_summary
+import litellm
+import logging
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """
+    Task: Create a brief, searchable summary (under 500 words total).
+
+    Structure:
+    **Overview:** 2 sentences - what this is about
+    **Facts:** Bullet list - key details only  
+    **Visual:** 2 sentences - image description
+    **Questions:** List 4-5 questions (no answers)
+    **Keywords:** 15-20 search terms
+
+    Be concise and avoid repetition.
+"""
+
+BATCH_SUMMARY_PROMPT = (
+    SUMMARY_PROMPT
+    + """
+    You are given several pages at once. Each starts with "Page id: N" and is
+    followed by its images. Summarize every page separately, using only that
+    page's text and images, and return one summary per page id.
+"""
+)
+
+
+def chunk_message_content(chunk, image_urls: list[str]) -> list[dict]:
+    return [
+        {"type": "text", "text": chunk.content},
+        *[{"type": "image_url", "image_url": url} for url in image_urls],
+    ]
+
+
+def summarize_chunk(chunk, images) -> str:
+    """Ask the vision model for a searchable summary of a page with images."""
+    image_urls = get_presigned_urls_for_chunk_images(
+        images=images,
+        expires_in=900,
+    )
+
+    messages = [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": chunk_message_content(chunk, image_urls)},
+    ]
+
+    response = get_llm_client().completion(
+        model=settings.SUMMARY_MODEL,
+        max_tokens=2000,
+        reasoning_effort="low",
+        messages=messages,
+        stream=False,
+    )
+
+    return response.choices[0].message.content
+
+
+def summarize_chunks(chunks_with_images: list[tuple]) -> dict:
+    """Summarize several pages in one structured request.
+
+    Returns chunk id -> summary for the pages the model answered; pages it
+    skipped, a reply that does not parse or a request the provider rejects
+    are summarized one at a time.
+    """
+    content = []
+    for page_id, (chunk, images) in enumerate(chunks_with_images):
+        image_urls = get_presigned_urls_for_chunk_images(
+            images=images,
+            expires_in=900,
+        )
+        content.append({"type": "text", "text": f"Page id: {page_id}"})
+        content.extend(chunk_message_content(chunk, image_urls))
+
+    summaries = {}
+
+    try:
+        response = get_llm_client().completion(
+            model=settings.SUMMARY_MODEL,
+            max_tokens=2000 * len(chunks_with_images),
+            reasoning_effort="low",
+            messages=[
+                {"role": "system", "content": BATCH_SUMMARY_PROMPT},
+                {"role": "user", "content": content},
+            ],
+            response_format=ChunkSummariesResponse,
+            stream=False,
+        )
+        parsed = ChunkSummariesResponse.model_validate_json(
+            response.choices[0].message.content
+        )
+
+        for item in parsed.summaries:
+            if 0 <= item.page_id < len(chunks_with_images) and item.summary.strip():
+                chunk, _ = chunks_with_images[item.page_id]
+                summaries[chunk.id] = item.summary
+
+    except ValidationError as e:
+        logger.warning(f"Batched summary did not parse, falling back: {e}")
+
+    except (litellm.BadRequestError, litellm.UnprocessableEntityError) as e:
+        # E.g. too many images or tokens for one request; single pages
+        # may still fit, and retrying the same batch would fail again.
+        logger.warning(f"Batched summary request rejected, falling back: {e}")
+
+    for chunk, images in chunks_with_images:
+        if chunk.id not in summaries:
+            summaries[chunk.id] = summarize_chunk(chunk, images)
+
+    return summaries
+
+
+def reuse_artifact(db, chunk, artifact):
+    """Copy a summary and embedding produced for the same page elsewhere."""
+    chunk.summarised_content = (
+        artifact.summary + "\n\n" + chunk.content
+        if artifact.summary is not None
+        else chunk.content
+    )
+    chunk.embedding = artifact.embedding
+    chunk.status = "embedded"
+    increment_document_progress(db, chunk.document_id, summarized=1, embedded=1)
+
+
+def apply_summary(db, chunk, summary: str | None) -> str:
+    """Mark the chunk summarized; returns the text to embed."""
+    if summary is None:
+        chunk.summarised_content = chunk.content
+        summarized_text = chunk.content
+    else:
+        chunk.summarised_content = summary + "\n\n" + chunk.content
+        summarized_text = summary
+
+    chunk.status = "summarized"
+    increment_document_progress(db, chunk.document_id, summarized=1)
+
+    return summarized_text
 
 
 @celery_app.task(
@@ -15,7 +160,6 @@ from litellm import embedding, completion
 def process_chunk(self, chunk_id: str):
     db = SessionLocal()
 
-    summarized_text = ""
     try:
         chunk_uuid = UUID(chunk_id)
 
@@ -24,114 +168,134 @@ def process_chunk(self, chunk_id: str):
         if not chunk:
             return {"status": "error", "message": "Chunk not found"}
 
-        if chunk.status == "embedded":
+        if chunk.status in ("summarized", "embedded"):
             return {"status": "already_processed"}
 
-        document = (
-            db.query(Document)
-            .filter(Document.id == chunk.document_id)
-            .with_for_update()
-            .first()
-        )
-
         images = db.query(Image).filter(Image.chunk_id == chunk.id).all()
 
+        artifact = get_chunk_artifact(db, chunk.content_hash)
+        document_id = chunk.document_id
+
+        # Same page already processed elsewhere (any project): copy it over.
+        if artifact is not None and artifact.embedding is not None:
+            reuse_artifact(db, chunk, artifact)
+            db.commit()
+
+            if claim_document_completion(db, document_id):
+                finalize_document.delay(str(document_id))
+
+            return {"status": "embedded", "reused": True}
+
+        summary = None
         if len(images) != 0:
-            image_urls = get_presigned_urls_for_chunk_images(
-                images=images,
-                expires_in=900,
-            )
-
-            messages = [
-                {
-                    "role": "system",
-                    "content": """
-                        Task: Create a brief, searchable summary (under 500 words total).
-
-                        Structure:
-                        **Overview:** 2 sentences - what this is about
-                        **Facts:** Bullet list - key details only  
-                        **Visual:** 2 sentences - image description
-                        **Questions:** List 4-5 questions (no answers)
-                        **Keywords:** 15-20 search terms
-
-                        Be concise and avoid repetition.
-                    """,
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": chunk.content},
-                        *[
-                            {"type": "image_url", "image_url": url}
-                            for url in image_urls
-                        ],
-                    ],
-                },
-            ]
-
-            response = completion(
-                model="gpt-5-mini",
-                max_tokens=2000,
-                reasoning_effort="low",
-                messages=messages,
-                stream=False,
-            )
-
-            summarized_text = response.choices[0].message.content
-
-            chunk.summarised_content = summarized_text + "\n\n" + chunk.content
-        else:
-            chunk.summarised_content = chunk.content
-            summarized_text = chunk.content
+            if artifact is not None and artifact.summary is not None:
+                summary = artifact.summary
+            else:
+                summary = summarize_chunk(chunk, images)
+                store_artifact_summary(db, chunk.content_hash, summary)
+
+        summarized_text = apply_summary(db, chunk, summary)
+        db.commit()
+
+        enqueue_for_embedding(chunk.id, summarized_text)
+        return {"status": "summarized"}
+
+    except:
+        db.rollback()
+        # autoretry runs the task again; only the last attempt fails the
+        # document, otherwise a successful retry could never complete it.
+        if self.request.retries >= self.max_retries:
+            mark_chunks_failed(db, [chunk_id])
+        raise
+
+    finally:
+        db.close()
+
+
+@celery_app.task(
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=10,
+    retry_kwargs={"max_retries": 3},
+)
+def process_chunk_batch(self, chunk_ids: list[str]):
+    """process_chunk for several pages; image pages share one summary request."""
+    db = SessionLocal()
 
-        chunk.status = "summarized"
-        document.chunks_summarized += 1
+    try:
+        chunk_uuids = sorted(UUID(c) for c in chunk_ids)
 
-        embed_resp = embedding(
-            model="text-embedding-3-small", input=summarized_text, dimensions=384
+        chunks = (
+            db.query(Chunk)
+            .filter(Chunk.id.in_(chunk_uuids))
+            .filter(Chunk.status.not_in(("summarized", "embedded")))
+            .order_by(Chunk.id)
+            .with_for_update()
+            .all()
         )
 
-        chunk.embedding = embed_resp.data[0]["embedding"]
-        chunk.status = "embedded"
-        document.chunks_embedded += 1
+        if not chunks:
+            return {"status": "already_processed"}
+
+        images_by_chunk = defaultdict(list)
+        for image in db.query(Image).filter(Image.chunk_id.in_([c.id for c in chunks])):
+            images_by_chunk[image.chunk_id].append(image)
+
+        reused_documents = set()
+        summaries = {}
+        to_summarize = []
 
-        if document.chunks_embedded == document.total_chunks:
-            document.status = "ready"
+        for chunk in chunks:
+            artifact = get_chunk_artifact(db, chunk.content_hash)
 
-            project = (
-                db.query(Project)
-                .filter(Project.id == document.project_id)
-                .with_for_update()
-                .first()
-            )
+            if artifact is not None and artifact.embedding is not None:
+                reuse_artifact(db, chunk, artifact)
+                reused_documents.add(chunk.document_id)
+            elif artifact is not None and artifact.summary is not None:
+                summaries[chunk.id] = artifact.summary
+            elif images_by_chunk[chunk.id]:
+                to_summarize.append((chunk, images_by_chunk[chunk.id]))
+            else:
+                summaries[chunk.id] = None
 
-            all_docs = (
-                db.query(Document).filter(Document.project_id == project.id).all()
-            )
+        if len(to_summarize) == 1:
+            chunk, images = to_summarize[0]
+            fresh = {chunk.id: summarize_chunk(chunk, images)}
+        elif to_summarize:
+            fresh = summarize_chunks(to_summarize)
+        else:
+            fresh = {}
 
-            if all(
-                d.status == "ready" and d.chunks_embedded == d.total_chunks
-                for d in all_docs
-            ):
-                project.status = "ready"
+        for chunk, _ in to_summarize:
+            store_artifact_summary(db, chunk.content_hash, fresh[chunk.id])
+        summaries.update(fresh)
 
+        to_embed = [
+            (chunk.id, apply_summary(db, chunk, summaries[chunk.id]))
+            for chunk in chunks
+            if chunk.id in summaries
+        ]
         db.commit()
-        return {"status": "done"}
 
-    except:
-        db.rollback()
+        for chunk_id, summarized_text in to_embed:
+            enqueue_for_embedding(chunk_id, summarized_text)
 
-        chunk = db.query(Chunk).filter(Chunk.id == chunk_uuid).first()
-        if chunk:
-            chunk.status = "failed"
-            document = (
-                db.query(Document).filter(Document.id == chunk.document_id).first()
-            )
-            if document:
-                document.status = "failed"
-            db.commit()
+        for document_id in reused_documents:
+            if claim_document_completion(db, document_id):
+                finalize_document.delay(str(document_id))
+
+        return {
+            "status": "summarized",
+            "summarized": len(to_summarize),
+            "reused": len(chunks) - len(to_embed),
+        }
 
+    except:
+        db.rollback()
+        # autoretry runs the task again; only the last attempt fails the
+        # document, otherwise a successful retry could never complete it.
+        if self.request.retries >= self.max_retries:
+            mark_chunks_failed(db, chunk_ids)
         raise
 
     finally:
@@ -1,10 +1,186 @@
+import time
+import uuid
+import logging
+from collections import defaultdict
 from celery_app import celery_app
+from config import settings
 from db import SessionLocal
 from models import Document, Chunk, Image, Project
 from uuid import UUID
-from utils.parse import chunk_document
-from tasks.process_chunk import process_chunk
-from utils.s3 import upload_image_to_s3
+from datetime import datetime
+from celery import group
+from sqlalchemy import insert, update, delete, func
+from utils.parse import iter_document_chunks
+from tasks.process_chunk import process_chunk_batch
+from tasks.bulk_ingest import submit_bulk_document
+from utils.s3 import ImageUploadBatch, delete_files_from_s3
+from utils.chunk_hash import chunk_content_hash
+from utils.image_preprocess import ImagePreprocessor
+from utils.answer_cache import invalidate_answer_cache
+from utils.progress import claim_document_completion, increment_document_progress
+from tasks.finalize_document import finalize_document
+
+logger = logging.getLogger(__name__)
+
+
+def load_reusable_chunks(db, document) -> dict[str, list]:
+    """Embedded chunks from a previous run of this document, by content hash."""
+    reusable = defaultdict(list)
+
+    rows = (
+        db.query(Chunk.id, Chunk.content_hash)
+        .filter(Chunk.document_id == document.id)
+        .filter(Chunk.status == "embedded")
+        .filter(Chunk.content_hash.is_not(None))
+        .all()
+    )
+    for row in rows:
+        reusable[row.content_hash].append(row.id)
+
+    return reusable
+
+
+def delete_chunks(db, stale_ids: list):
+    """Remove chunks left over from a previous run, with their images."""
+    if not stale_ids:
+        return
+
+    image_keys = [
+        row.s3_key
+        for row in db.query(Image.s3_key).filter(Image.chunk_id.in_(stale_ids))
+    ]
+
+    db.execute(delete(Image).where(Image.chunk_id.in_(stale_ids)))
+    db.execute(delete(Chunk).where(Chunk.id.in_(stale_ids)))
+    db.commit()
+
+    delete_files_from_s3(image_keys)
+
+
+def count_chunk_progress(db, document_id) -> tuple[int, int]:
+    """Summarized and embedded counts from the document's current chunk rows.
+
+    Tasks from an aborted earlier attempt may have counted chunks that have
+    since been deleted or replaced; taken under the document lock, once the
+    stale chunks are gone, this resets the counters to what actually exists.
+    """
+    summarized, embedded = (
+        db.query(
+            func.count().filter(Chunk.status.in_(("summarized", "embedded"))),
+            func.count().filter(Chunk.status == "embedded"),
+        )
+        .filter(Chunk.document_id == document_id)
+        .one()
+    )
+
+    return summarized, embedded
+
+
+def chunk_tasks(chunk_rows: list[dict]) -> list:
+    """Summarization tasks for new chunks, each covering several pages.
+
+    Text-only pages need no LLM call and all go in one task; image pages
+    are split into groups of SUMMARY_BATCH_SIZE that share a request.
+    """
+    batch_size = max(settings.SUMMARY_BATCH_SIZE, 1)
+
+    text_ids = [str(row["id"]) for row in chunk_rows if not row["has_image"]]
+    image_ids = [str(row["id"]) for row in chunk_rows if row["has_image"]]
+
+    tasks = [process_chunk_batch.s(text_ids)] if text_ids else []
+    return tasks + [
+        process_chunk_batch.s(image_ids[i : i + batch_size])
+        for i in range(0, len(image_ids), batch_size)
+    ]
+
+
+def persist_chunks(
+    db,
+    project,
+    document,
+    chunks: list[dict],
+    reusable: dict[str, list],
+    dispatch: bool = True,
+) -> tuple[int, list]:
+    """Insert a group of parsed pages and queue them for summarization.
+
+    Pages whose content hash matches an embedded chunk from a previous run
+    keep that chunk (summary and embedding included) instead. Returns the
+    number of uploaded images and the ids of reused chunks.
+    """
+    # Ids are generated client side so images can reference their chunk
+    # without a flush per chunk; rows are then inserted in bulk.
+    chunk_rows = []
+    image_rows = []
+    reused = []
+
+    with ImageUploadBatch(settings.S3_UPLOAD_CONCURRENCY) as uploads:
+        for chunk in chunks:
+            content_hash = chunk_content_hash(chunk)
+
+            if reusable.get(content_hash):
+                chunk_id = reusable[content_hash].pop()
+                reused.append({"id": chunk_id, "page_number": chunk["page_number"]})
+                continue
+
+            chunk_id = uuid.uuid4()
+
+            chunk_rows.append(
+                {
+                    "id": chunk_id,
+                    "project_id": project.id,
+                    "document_id": document.id,
+                    "content": chunk["content"],
+                    "page_number": chunk["page_number"],
+                    "has_text": "text" in chunk["type"],
+                    "has_image": "image" in chunk["type"],
+                    "has_table": "table" in chunk["type"],
+                    "content_hash": content_hash,
+                }
+            )
+
+            for image_path in chunk.get("images", []):
+                uploads.submit(
+                    chunk_id,
+                    image_path=image_path,
+                    user_id=project.user_id,
+                    project_id=project.id,
+                    document_id=document.id,
+                    chunk_id=chunk_id,
+                    page_number=chunk["page_number"],
+                )
+
+        # Chunk rows go in while the uploads are still running.
+        if chunk_rows:
+            db.execute(insert(Chunk), chunk_rows)
+
+        for chunk_id, upload_result in uploads.results():
+            image_rows.append(
+                {
+                    "id": uuid.uuid4(),
+                    "chunk_id": chunk_id,
+                    "s3_key": upload_result["s3_key"],
+                }
+            )
+
+    if image_rows:
+        db.execute(insert(Image), image_rows)
+
+    if reused:
+        # Pages may have moved, the rest of the chunk is unchanged.
+        db.execute(update(Chunk), reused)
+        increment_document_progress(
+            db, document.id, summarized=len(reused), embedded=len(reused)
+        )
+
+    db.commit()
+
+    # A group still publishes one message per task, so the saving comes from
+    # chunk_tasks() covering many pages per task.
+    if chunk_rows and dispatch:
+        group(chunk_tasks(chunk_rows)).apply_async()
+
+    return len(image_rows), [row["id"] for row in reused]
 
 
 @celery_app.task(
@@ -35,55 +211,111 @@ def process_document(self, project_id: str, document_id: str):
             return {"status": "already_processing"}
 
         document.status = "chunking"
+        document.total_chunks = None
+        document.chunks_summarized = 0
+        document.chunks_embedded = 0
+        document.processing_started_at = datetime.utcnow()
+        document.parsed_at = None
+        document.completed_at = None
+        document.stage_durations = None
+        invalidate_answer_cache(db, project.id)
         db.commit()
 
-        chunks = chunk_document(document)
+        previous_ids = {
+            row.id for row in db.query(Chunk.id).filter(Chunk.document_id == doc_uuid)
+        }
+        reusable = load_reusable_chunks(db, document)
+        reused_ids = set()
+        # Bulk mode queues nothing per chunk; batch jobs are submitted once
+        # the whole document is parsed.
+        bulk = settings.INGEST_MODE == "bulk"
+        preprocessor = ImagePreprocessor()
 
-        for chunk in chunks:
-            new_chunk = Chunk(
-                project_id=project.id,
-                document_id=document.id,
-                content=chunk["content"],
-                page_number=chunk["page_number"],
-                has_text="text" in chunk["type"],
-                has_image="image" in chunk["type"],
-                has_table="table" in chunk["type"],
-            )
+        start = time.perf_counter()
+        first_queued_ms = None
+        total_chunks = 0
+        total_images = 0
+        pending = []
 
-            db.add(new_chunk)
-            db.flush()
+        # With a streaming parser, pages are persisted and queued as soon as a
+        # small group has been parsed, so summarization overlaps with the rest
+        # of the parse. Otherwise everything arrives at once and is persisted
+        # in one pass.
+        for chunks in iter_document_chunks(document):
+            for chunk in chunks:
+                if settings.IMAGE_PREPROCESS_ENABLED:
+                    chunk = preprocessor.process_chunk(chunk)
+                pending.append(chunk)
 
-            for image_path in chunk.get("images", []):
-                upload_result = upload_image_to_s3(
-                    image_path=image_path,
-                    user_id=project.user_id,
-                    project_id=project_uuid,
-                    document_id=doc_uuid,
-                    chunk_id=new_chunk.id,
-                    page_number=new_chunk.page_number,
+            if len(pending) >= settings.INGEST_FLUSH_PAGES:
+                images, reused = persist_chunks(
+                    db, project, document, pending, reusable, dispatch=not bulk
                 )
+                total_images += images
+                reused_ids.update(reused)
 
-                if upload_result["status"] != "uploaded":
-                    raise RuntimeError(
-                        f"Image upload failed: {upload_result.get('error')}"
+                if first_queued_ms is None:
+                    first_queued_ms = (time.perf_counter() - start) * 1000
+                    logger.info(
+                        f"Document {document.id}: first chunks queued after "
+                        f"{first_queued_ms:.2f} ms"
                     )
 
-                db.add(
-                    Image(
-                        chunk_id=new_chunk.id,
-                        s3_key=upload_result.get("s3_key"),
-                    )
-                )
+                total_chunks += len(pending)
+                pending = []
 
-        document.total_chunks = len(chunks)
-        document.chunks_summarized = 0
-        document.chunks_embedded = 0
-        document.status = "processing"
+        if pending:
+            images, reused = persist_chunks(
+                db, project, document, pending, reusable, dispatch=not bulk
+            )
+            total_images += images
+            reused_ids.update(reused)
+            total_chunks += len(pending)
+
+            if first_queued_ms is None:
+                first_queued_ms = (time.perf_counter() - start) * 1000
+
+        parse_ms = (time.perf_counter() - start) * 1000
+        if settings.IMAGE_PREPROCESS_ENABLED:
+            preprocessor.log_summary(document_id)
+
+        # Pages that changed or disappeared since the last run.
+        delete_chunks(db, list(previous_ids - reused_ids))
+
+        document = (
+            db.query(Document)
+            .filter(Document.id == doc_uuid)
+            .with_for_update()
+            .populate_existing()
+            .first()
+        )
+        document.total_chunks = total_chunks
+        document.chunks_summarized, document.chunks_embedded = count_chunk_progress(
+            db, doc_uuid
+        )
+        document.parsed_at = datetime.utcnow()
+        document.stage_durations = {
+            "parse_ms": parse_ms,
+            "first_queued_ms": first_queued_ms,
+        }
+
+        # A chunk task may already have failed the document.
+        if document.status != "failed":
+            document.status = "processing"
 
         db.commit()
 
-        for chunk in db.query(Chunk).filter(Chunk.document_id == document.id).all():
-            process_chunk.delay(str(chunk.id))
+        if bulk and document.status != "failed":
+            submit_bulk_document.delay(document_id)
+
+        # Every chunk may already be embedded by the time parsing ends.
+        if claim_document_completion(db, doc_uuid):
+            finalize_document.delay(document_id)
+
+        logger.info(
+            f"Ingested document {document_id}: {total_chunks} chunks "
+            f"({len(reused_ids)} reused), {total_images} images in {parse_ms:.2f} ms"
+        )
 
         return {"status": "success", "message": "Chunks created and queued"}
 
@@ -0,0 +1,66 @@
+from uuid import UUID
+from sqlalchemy import select
+from config import settings
+from models import CachedAnswer
+
+
+def answer_cache_options(message) -> str:
+    """Retrieval settings that change the answer; only equal ones may match."""
+    return f"hybrid={bool(message.hybrid_search)};reranking={bool(message.reranking)}"
+
+
+async def find_cached_answer(
+    db, project_id: UUID, query_embedding: list[float], options: str
+):
+    distance = CachedAnswer.query_embedding.cosine_distance(query_embedding)
+
+    row = (
+        await db.execute(
+            select(CachedAnswer, distance.label("distance"))
+            .where(CachedAnswer.project_id == project_id)
+            .where(CachedAnswer.options == options)
+            .order_by(distance)
+            .limit(1)
+        )
+    ).first()
+
+    if row and 1 - row.distance >= settings.ANSWER_CACHE_SIMILARITY:
+        return row.CachedAnswer
+
+    return None
+
+
+def store_cached_answer(
+    db,
+    project_id: UUID,
+    query: str,
+    query_embedding: list[float],
+    options: str,
+    answer: str,
+    citations: list,
+):
+    db.add(
+        CachedAnswer(
+            project_id=project_id,
+            query=query,
+            query_embedding=query_embedding,
+            options=options,
+            answer=answer,
+            citations=[
+                {
+                    "document_name": c.document_name,
+                    "document_s3_key": c.document_s3_key,
+                    "page_number": c.page_number,
+                    "total_pages": c.total_pages,
+                }
+                for c in citations
+            ],
+        )
+    )
+
+
+def invalidate_answer_cache(db, project_id: UUID):
+    """Drop cached answers once the project's documents change."""
+    db.query(CachedAnswer).filter(CachedAnswer.project_id == project_id).delete(
+        synchronize_session=False
+    )
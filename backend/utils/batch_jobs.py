@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import uuid
+import litellm
+from config import settings
+from utils.embedding_batcher import fake_embedding
+
+CHAT_COMPLETIONS_ENDPOINT = "/v1/chat/completions"
+EMBEDDINGS_ENDPOINT = "/v1/embeddings"
+
+
+def batch_request(custom_id: str, endpoint: str, body: dict) -> dict:
+    return {"custom_id": custom_id, "method": "POST", "url": endpoint, "body": body}
+
+
+def write_jsonl(path: str, rows: list[dict]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+
+
+def read_jsonl(text: str) -> list[dict]:
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def parse_result_line(line: dict) -> dict:
+    """Normalize a batch output line to {custom_id, body, error}."""
+    response = line.get("response") or {}
+
+    if response.get("status_code") == 200:
+        return {"custom_id": line["custom_id"], "body": response["body"], "error": None}
+
+    error = line.get("error") or response.get("body", {}).get("error") or "failed"
+    return {"custom_id": line["custom_id"], "body": None, "error": error}
+
+
+class BatchBackend:
+    """Submits a JSONL file of requests as one asynchronous job.
+
+    status() returns "in_progress", "completed" or "failed"; results()
+    returns one normalized entry per request of a completed job.
+    """
+
+    name = "base"
+
+    def submit(self, requests: list[dict], endpoint: str) -> str:
+        raise NotImplementedError
+
+    def status(self, job_id: str) -> str:
+        raise NotImplementedError
+
+    def results(self, job_id: str) -> list[dict]:
+        raise NotImplementedError
+
+
+class OpenAIBatchBackend(BatchBackend):
+    name = "openai"
+
+    def __init__(self, work_dir: str):
+        self.work_dir = work_dir
+
+    def submit(self, requests: list[dict], endpoint: str) -> str:
+        path = os.path.join(self.work_dir, f"{uuid.uuid4()}.jsonl")
+        write_jsonl(path, requests)
+
+        try:
+            with open(path, "rb") as f:
+                input_file = litellm.create_file(
+                    file=f, purpose="batch", custom_llm_provider="openai"
+                )
+        finally:
+            os.remove(path)
+
+        batch = litellm.create_batch(
+            completion_window="24h",
+            endpoint=endpoint,
+            input_file_id=input_file.id,
+            custom_llm_provider="openai",
+        )
+        return batch.id
+
+    def status(self, job_id: str) -> str:
+        batch = litellm.retrieve_batch(batch_id=job_id, custom_llm_provider="openai")
+
+        if batch.status == "completed":
+            return "completed"
+        if batch.status in ("failed", "expired", "cancelled"):
+            return "failed"
+        return "in_progress"
+
+    def results(self, job_id: str) -> list[dict]:
+        batch = litellm.retrieve_batch(batch_id=job_id, custom_llm_provider="openai")
+
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = litellm.file_content(
+                    file_id=file_id, custom_llm_provider="openai"
+                )
+                lines.extend(read_jsonl(content.text))
+
+        return [parse_result_line(line) for line in lines]
+
+
+class LocalBatchBackend(BatchBackend):
+    """File-based stand-in for the provider batch API, for tests and dry runs.
+
+    Jobs complete after `delay` seconds with deterministic fake summaries
+    and embeddings; requests without a model fail like a rejected line.
+    """
+
+    name = "local"
+
+    def __init__(self, work_dir: str, delay: float = 0):
+        self.work_dir = work_dir
+        self.delay = delay
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.work_dir, job_id)
+
+    def submit(self, requests: list[dict], endpoint: str) -> str:
+        job_id = f"local-{uuid.uuid4()}"
+        write_jsonl(os.path.join(self.job_dir(job_id), "input.jsonl"), requests)
+
+        with open(os.path.join(self.job_dir(job_id), "job.json"), "w") as f:
+            json.dump({"endpoint": endpoint, "submitted_at": time.time()}, f)
+
+        return job_id
+
+    def status(self, job_id: str) -> str:
+        with open(os.path.join(self.job_dir(job_id), "job.json")) as f:
+            job = json.load(f)
+
+        if time.time() - job["submitted_at"] < self.delay:
+            return "in_progress"
+
+        output_path = os.path.join(self.job_dir(job_id), "output.jsonl")
+        if not os.path.exists(output_path):
+            with open(os.path.join(self.job_dir(job_id), "input.jsonl")) as f:
+                requests = read_jsonl(f.read())
+            write_jsonl(output_path, [self.simulate(r) for r in requests])
+
+        return "completed"
+
+    def results(self, job_id: str) -> list[dict]:
+        with open(os.path.join(self.job_dir(job_id), "output.jsonl")) as f:
+            return [parse_result_line(line) for line in read_jsonl(f.read())]
+
+    def simulate(self, request: dict) -> dict:
+        body = request["body"]
+
+        if not body.get("model"):
+            return {
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 400, "body": {}},
+                "error": {"message": "model is required"},
+            }
+
+        if request["url"] == EMBEDDINGS_ENDPOINT:
+            inputs = (
+                body["input"] if isinstance(body["input"], list) else [body["input"]]
+            )
+            response_body = {
+                "data": [
+                    {"index": i, "embedding": fake_embedding(text, body["dimensions"])}
+                    for i, text in enumerate(inputs)
+                ]
+            }
+        else:
+            text = " ".join(
+                part["text"]
+                for message in body["messages"]
+                if isinstance(message["content"], list)
+                for part in message["content"]
+                if part["type"] == "text"
+            )
+            response_body = {
+                "choices": [
+                    {
+                        "message": {
+                            "role": "assistant",
+                            "content": f"Summary: {text[:200]}",
+                        }
+                    }
+                ]
+            }
+
+        return {
+            "custom_id": request["custom_id"],
+            "response": {"status_code": 200, "body": response_body},
+            "error": None,
+        }
+
+
+def get_batch_backend() -> BatchBackend:
+    if settings.BATCH_BACKEND == "openai":
+        return OpenAIBatchBackend(settings.BATCH_WORK_DIR)
+    if settings.BATCH_BACKEND == "local":
+        return LocalBatchBackend(settings.BATCH_WORK_DIR)
+    raise ValueError(f"Unsupported BATCH_BACKEND: {settings.BATCH_BACKEND}")
@@ -0,0 +1,74 @@
+from sqlalchemy import text, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+
+# Only one rollup at a time; a concurrent one simply skips.
+ROLLUP_LOCK_ID = 820125
+
+ROLLUP_DOC_STATS = text("""
+    WITH moved AS (
+        DELETE FROM project_bm25_deltas
+        RETURNING project_id, doc_count, total_length
+    )
+    INSERT INTO project_bm25_stats AS s (project_id, doc_count, total_length)
+    SELECT project_id, sum(doc_count), sum(total_length)
+    FROM moved
+    GROUP BY project_id
+    ORDER BY project_id
+    ON CONFLICT (project_id) DO UPDATE SET
+        doc_count = s.doc_count + excluded.doc_count,
+        total_length = s.total_length + excluded.total_length
+    RETURNING project_id
+""")
+
+ROLLUP_TERM_STATS = text("""
+    WITH moved AS (
+        DELETE FROM project_term_deltas
+        RETURNING project_id, term, doc_freq
+    )
+    INSERT INTO project_term_stats AS s (project_id, term, doc_freq)
+    SELECT project_id, term, sum(doc_freq)
+    FROM moved
+    GROUP BY project_id, term
+    ORDER BY project_id, term
+    ON CONFLICT (project_id, term) DO UPDATE SET
+        doc_freq = s.doc_freq + excluded.doc_freq
+""")
+
+
+def fold_bm25_deltas(db) -> int:
+    """Fold the delta rows written by the chunks triggers into the totals.
+
+    Ingestion only appends deltas, so it never waits on shared term rows;
+    searches add any deltas not rolled up yet. Terms and projects that
+    dropped to zero are pruned. Returns the number of projects touched.
+    Commits the session.
+    """
+    locked = db.execute(
+        text("SELECT pg_try_advisory_xact_lock(:lock_id)"),
+        {"lock_id": ROLLUP_LOCK_ID},
+    ).scalar()
+
+    if not locked:
+        db.rollback()
+        return 0
+
+    project_ids = list(db.execute(ROLLUP_DOC_STATS).scalars())
+    db.execute(ROLLUP_TERM_STATS)
+
+    if project_ids:
+        ids = bindparam("project_ids", project_ids, type_=ARRAY(PG_UUID(as_uuid=True)))
+        db.execute(
+            text("""
+                DELETE FROM project_term_stats
+                WHERE project_id = ANY(:project_ids) AND doc_freq <= 0
+            """).bindparams(ids)
+        )
+        db.execute(
+            text("""
+                DELETE FROM project_bm25_stats
+                WHERE project_id = ANY(:project_ids) AND doc_count <= 0
+            """).bindparams(ids)
+        )
+
+    db.commit()
+    return len(project_ids)
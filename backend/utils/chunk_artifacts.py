@@ -0,0 +1,40 @@
+from sqlalchemy.dialects.postgresql import insert
+from models import ChunkArtifact
+
+
+def get_chunk_artifact(db, content_hash: str | None):
+    if content_hash is None:
+        return None
+    return db.get(ChunkArtifact, content_hash)
+
+
+def store_artifact_summary(db, content_hash: str | None, summary: str):
+    if content_hash is None:
+        return
+
+    stmt = insert(ChunkArtifact).values(content_hash=content_hash, summary=summary)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[ChunkArtifact.content_hash],
+            set_={"summary": stmt.excluded.summary},
+            where=ChunkArtifact.summary.is_(None),
+        )
+    )
+
+
+def store_artifact_embeddings(db, embeddings: dict[str, list[float]]):
+    """Upsert embeddings by content hash; existing vectors are kept."""
+    if not embeddings:
+        return
+
+    # Sorted so concurrent flushes lock rows in the same order.
+    stmt = insert(ChunkArtifact).values(
+        [{"content_hash": h, "embedding": e} for h, e in sorted(embeddings.items())]
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[ChunkArtifact.content_hash],
+            set_={"embedding": stmt.excluded.embedding},
+            where=ChunkArtifact.embedding.is_(None),
+        )
+    )
@@ -0,0 +1,33 @@
+import hashlib
+from config import settings
+
+# Bump when the summarization prompt or chunk text preparation changes, so
+# previously processed chunks are summarized and embedded again.
+CHUNK_HASH_VERSION = "v1"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_content_hash(chunk: dict) -> str:
+    """Hash of everything that determines a chunk's summary and embedding."""
+    digest = hashlib.sha256()
+
+    for part in (
+        CHUNK_HASH_VERSION,
+        settings.SUMMARY_MODEL,
+        settings.EMBEDDING_MODEL,
+        str(settings.EMBEDDING_DIMENSIONS),
+        chunk["type"],
+        chunk["content"],
+        *(file_sha256(p) for p in chunk.get("images", [])),
+    ):
+        digest.update(part.encode())
+        digest.update(b"\0")
+
+    return digest.hexdigest()
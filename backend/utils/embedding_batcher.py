@@ -0,0 +1,241 @@
+import json
+import time
+import random
+import hashlib
+from litellm import embedding
+
+
+def estimate_tokens(text: str) -> int:
+    # Rough cl100k estimate, good enough for request budgeting.
+    return len(text) // 4 + 1
+
+
+class EmbeddingBatchError(RuntimeError):
+    """Raised when a provider call fails part way through a flush."""
+
+    def __init__(self, results: dict, failed: list[dict]):
+        super().__init__(f"Embedding failed for {len(failed)} pending inputs")
+        self.results = results
+        self.failed = failed
+
+
+class InMemoryEmbeddingQueue:
+    """Process-local stand-in for RedisEmbeddingQueue, for tests and dry runs.
+
+    Same lease semantics: popped inputs stay in flight until ack() or
+    requeue(), and recover() returns those whose lease ran out.
+    """
+
+    def __init__(self, lease_ttl: float = 300):
+        self.lease_ttl = lease_ttl
+        self.items = []
+        self.processing = []
+
+    def push(self, item: dict):
+        self.items.append(item)
+
+    def pop_many(self, count: int) -> list[dict]:
+        popped, self.items = self.items[:count], self.items[count:]
+        expires_at = time.monotonic() + self.lease_ttl
+        self.processing.extend((expires_at, item) for item in popped)
+        return popped
+
+    def ack(self, items: list[dict]):
+        for item in items:
+            for i, (_, leased) in enumerate(self.processing):
+                if leased == item:
+                    del self.processing[i]
+                    break
+
+    def requeue(self, items: list[dict]):
+        self.ack(items)
+        self.items[:0] = items
+
+    def recover(self) -> int:
+        now = time.monotonic()
+        expired = [item for expires_at, item in self.processing if expires_at <= now]
+        self.processing = [p for p in self.processing if p[0] > now]
+        self.items[:0] = expired
+        return len(expired)
+
+    def in_flight(self) -> int:
+        return len(self.processing)
+
+    def __len__(self):
+        return len(self.items)
+
+
+# Moves up to ARGV[1] inputs from the pending list into the processing set,
+# scored by lease expiry. KEYS: pending, processing. ARGV: count, lease ttl.
+LEASE_SCRIPT = """
+local items = redis.call('LPOP', KEYS[1], ARGV[1])
+if not items then
+    return {}
+end
+
+local t = redis.call('TIME')
+local expires_at = tonumber(t[1]) + tonumber(ARGV[2])
+for _, item in ipairs(items) do
+    redis.call('ZADD', KEYS[2], expires_at, item)
+end
+return items
+"""
+
+# Puts inputs whose lease expired (their flush died or failed before
+# storing them) back at the front of the pending list.
+RECOVER_SCRIPT = """
+local t = redis.call('TIME')
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', t[1])
+for i = #expired, 1, -1 do
+    redis.call('LPUSH', KEYS[1], expired[i])
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', t[1])
+return #expired
+"""
+
+
+class RedisEmbeddingQueue:
+    """Pending inputs in a Redis list, leased while a flush works on them.
+
+    pop_many() does not drop inputs: they stay in a processing set until
+    ack() (stored) or requeue() (retry), and recover() returns those whose
+    lease ran out.
+    """
+
+    def __init__(self, client, key: str = "embedding:pending", lease_ttl: int = 300):
+        self.client = client
+        self.key = key
+        self.processing_key = f"{key}:processing"
+        self.lease_ttl = lease_ttl
+        self._lease = client.register_script(LEASE_SCRIPT)
+        self._recover = client.register_script(RECOVER_SCRIPT)
+
+    def push(self, item: dict):
+        self.client.rpush(self.key, json.dumps(item))
+
+    def pop_many(self, count: int) -> list[dict]:
+        raw = self._lease(
+            keys=[self.key, self.processing_key], args=[count, self.lease_ttl]
+        )
+        return [json.loads(item) for item in raw]
+
+    def ack(self, items: list[dict]):
+        if items:
+            self.client.zrem(self.processing_key, *[json.dumps(i) for i in items])
+
+    def requeue(self, items: list[dict]):
+        if items:
+            raw = [json.dumps(i) for i in items]
+            pipe = self.client.pipeline()
+            pipe.lpush(self.key, *reversed(raw))
+            pipe.zrem(self.processing_key, *raw)
+            pipe.execute()
+
+    def recover(self) -> int:
+        return int(self._recover(keys=[self.key, self.processing_key]))
+
+    def in_flight(self) -> int:
+        return self.client.zcard(self.processing_key)
+
+    def __len__(self):
+        return self.client.llen(self.key)
+
+
+class LiteLLMEmbeddingProvider:
+    def __init__(self, model: str, dimensions: int, client=None):
+        self.model = model
+        self.dimensions = dimensions
+        # Anything with an embedding(**kwargs) method, e.g. LLMClient.
+        self.embed = client.embedding if client else embedding
+
+    def __call__(self, texts: list[str]) -> list[list[float]]:
+        resp = self.embed(model=self.model, input=texts, dimensions=self.dimensions)
+        data = sorted(resp.data, key=lambda d: d["index"])
+        return [d["embedding"] for d in data]
+
+
+def fake_embedding(text: str, dimensions: int) -> list[float]:
+    """Deterministic unit vector for a text, no provider involved."""
+    rng = random.Random(hashlib.sha256(text.encode()).digest())
+    vector = [rng.gauss(0, 1) for _ in range(dimensions)]
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector]
+
+
+class FakeEmbeddingProvider:
+    """Offline provider for tests and dry runs; same text, same vector."""
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+
+    def __call__(self, texts: list[str]) -> list[list[float]]:
+        return [fake_embedding(text, self.dimensions) for text in texts]
+
+
+class EmbeddingBatcher:
+    """Collects embedding inputs and sends them to the provider in batches.
+
+    Batches are bounded by both input count and estimated tokens. The
+    provider is any callable mapping a list of texts to a list of vectors.
+    """
+
+    def __init__(self, queue, provider, max_batch_size: int, max_batch_tokens: int):
+        self.queue = queue
+        self.provider = provider
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+
+    def submit(self, chunk_id: str, text: str):
+        self.queue.push({"chunk_id": chunk_id, "text": text})
+
+    def pending(self) -> int:
+        return len(self.queue)
+
+    def split(self, items: list[dict]) -> list[list[dict]]:
+        batches = []
+        current, current_tokens = [], 0
+
+        for item in items:
+            tokens = estimate_tokens(item["text"])
+            if current and (
+                len(current) >= self.max_batch_size
+                or current_tokens + tokens > self.max_batch_tokens
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(item)
+            current_tokens += tokens
+
+        if current:
+            batches.append(current)
+
+        return batches
+
+    def take(self) -> list[dict]:
+        """Lease up to one batch worth of pending inputs; ack() once stored."""
+        return self.queue.pop_many(self.max_batch_size)
+
+    def ack(self, items: list[dict]):
+        self.queue.ack(items)
+
+    def flush(self, items: list[dict]) -> dict[str, list[float]]:
+        """Embed inputs returned by take().
+
+        Returns a chunk_id -> vector mapping. On provider failure raises
+        EmbeddingBatchError with whatever succeeded and the inputs that did
+        not; those are not requeued, the caller decides.
+        """
+        results = {}
+
+        batches = self.split(items)
+        for i, batch in enumerate(batches):
+            try:
+                vectors = self.provider([item["text"] for item in batch])
+            except Exception as e:
+                failed = [item for b in batches[i:] for item in b]
+                raise EmbeddingBatchError(results, failed) from e
+
+            for item, vector in zip(batch, vectors):
+                results[item["chunk_id"]] = vector
+
+        return results
@@ -0,0 +1,104 @@
+import numpy as np
+
+FUSION_METHODS = ("rrf", "combsum", "combmnz")
+
+
+def normalize_scores(scores: np.ndarray, method: str = "minmax") -> np.ndarray:
+    """Put one retriever's scores on a comparable scale (higher is better)."""
+    scores = np.asarray(scores, dtype=np.float64)
+
+    if method == "none" or scores.size == 0:
+        return scores
+
+    if method == "minmax":
+        low, high = scores.min(), scores.max()
+        if high == low:
+            return np.ones_like(scores)
+        return (scores - low) / (high - low)
+
+    if method == "zscore":
+        std = scores.std()
+        if std == 0:
+            return np.zeros_like(scores)
+        return (scores - scores.mean()) / std
+
+    raise ValueError(f"Unsupported normalization: {method}")
+
+
+def from_pairs(pairs: list[tuple]) -> tuple[list, list]:
+    """(id, score) pairs, as returned by the retrievers, to an (ids, scores) ranking."""
+    return [p[0] for p in pairs], [p[1] for p in pairs]
+
+
+def fuse(
+    rankings: list,
+    method: str = "rrf",
+    weights: list[float] | None = None,
+    k: int = 60,
+    normalization: str = "minmax",
+    limit: int | None = None,
+) -> tuple[list, np.ndarray]:
+    """Fuse any number of ranked id lists into one ranking.
+
+    Each entry of `rankings` is either a list of ids, best first, or an
+    `(ids, scores)` pair with higher scores better. RRF only uses ranks;
+    CombSUM/CombMNZ need scores and normalize them per retriever first.
+    Returns the fused ids and their scores, best first; ties keep the
+    order in which ids were first seen.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unsupported fusion method: {method}")
+
+    weights = weights or [1.0] * len(rankings)
+    if len(weights) != len(rankings):
+        raise ValueError("Need one weight per ranking")
+
+    all_ids = []
+    contributions = []
+
+    for ranking, weight in zip(rankings, weights):
+        if isinstance(ranking, tuple):
+            ids, scores = ranking
+        else:
+            ids, scores = ranking, None
+
+        ids = list(ids)
+        if not ids:
+            continue
+
+        if method == "rrf":
+            ranks = np.arange(1, len(ids) + 1, dtype=np.float64)
+            contribution = weight / (k + ranks)
+        else:
+            if scores is None:
+                raise ValueError(f"{method} needs (ids, scores) rankings")
+            contribution = weight * normalize_scores(scores, normalization)
+
+        all_ids.extend(ids)
+        contributions.append(contribution)
+
+    if not all_ids:
+        return [], np.empty(0)
+
+    # Dense codes in first-seen order; a dict lookup per id is the only
+    # Python-level work, the scoring itself is vectorized.
+    codes = {}
+    inverse = np.fromiter(
+        (codes.setdefault(i, len(codes)) for i in all_ids),
+        dtype=np.intp,
+        count=len(all_ids),
+    )
+    unique_ids = list(codes)
+
+    fused = np.bincount(
+        inverse, weights=np.concatenate(contributions), minlength=len(unique_ids)
+    )
+
+    if method == "combmnz":
+        fused *= np.bincount(inverse, minlength=len(unique_ids))
+
+    order = np.argsort(-fused, kind="stable")
+    if limit is not None:
+        order = order[:limit]
+
+    return [unique_ids[i] for i in order], fused[order]
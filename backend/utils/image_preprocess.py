@@ -0,0 +1,138 @@
+import os
+import tempfile
+import logging
+from PIL import Image as PILImage, ImageStat, UnidentifiedImageError
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg", "png": ".png"}
+
+
+def dhash(image, size: int = 8) -> int:
+    """Difference hash: near-identical images differ in only a few bits."""
+    gray = image.convert("L").resize((size + 1, size), PILImage.Resampling.LANCZOS)
+    pixels = list(gray.getdata())
+
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+
+    return value
+
+
+def is_decorative(image) -> bool:
+    width, height = image.size
+
+    if min(width, height) < settings.IMAGE_MIN_SIDE:
+        return True
+
+    # Rules, borders and separators.
+    if max(width, height) / min(width, height) > settings.IMAGE_MAX_ASPECT_RATIO:
+        return True
+
+    # Flat fills and near-blank backgrounds.
+    stddev = ImageStat.Stat(image.convert("L")).stddev[0]
+    return stddev < settings.IMAGE_MIN_STDDEV
+
+
+class ImagePreprocessor:
+    """Shrinks and filters a document's images before upload.
+
+    One instance per document: images seen on earlier pages are remembered
+    so repeats (logos, headers) are only kept the first time.
+    """
+
+    def __init__(self):
+        self.seen_hashes = []
+        self.stats = {"kept": 0, "decorative": 0, "duplicate": 0}
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def is_duplicate(self, value: int) -> bool:
+        for seen in self.seen_hashes:
+            if (value ^ seen).bit_count() <= settings.IMAGE_DEDUPE_DISTANCE:
+                return True
+        self.seen_hashes.append(value)
+        return False
+
+    def process_image(self, path: str) -> str | None:
+        """Returns the path to upload, or None if the image should be dropped."""
+        try:
+            with PILImage.open(path) as image:
+                image.load()
+        except (UnidentifiedImageError, OSError):
+            # Keep formats Pillow cannot read as they are.
+            return path
+
+        size_in = os.path.getsize(path)
+        self.bytes_in += size_in
+
+        if is_decorative(image):
+            self.stats["decorative"] += 1
+            return None
+
+        if self.is_duplicate(dhash(image)):
+            self.stats["duplicate"] += 1
+            return None
+
+        fmt = settings.IMAGE_OUTPUT_FORMAT
+        if image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        if fmt == "jpeg" and image.mode != "RGB":
+            image = image.convert("RGB")
+
+        original_size = image.size
+        image.thumbnail(
+            (settings.IMAGE_MAX_SIDE, settings.IMAGE_MAX_SIDE),
+            PILImage.Resampling.LANCZOS,
+        )
+
+        # Written next to the original so cached parse results stay intact.
+        out_dir = os.path.join(os.path.dirname(path), "processed")
+        os.makedirs(out_dir, exist_ok=True)
+        name = os.path.splitext(os.path.basename(path))[0]
+        out_path = os.path.join(out_dir, name + OUTPUT_EXTENSIONS[fmt])
+
+        # Unique temp name: workers handling the same cached file share out_dir.
+        fd, tmp_path = tempfile.mkstemp(dir=out_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                image.save(f, format=fmt, quality=settings.IMAGE_QUALITY, optimize=True)
+            os.replace(tmp_path, out_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        self.stats["kept"] += 1
+        size_out = os.path.getsize(out_path)
+
+        # Recompressing an already small image can make it larger.
+        if image.size == original_size and size_out >= size_in:
+            self.bytes_out += size_in
+            return path
+
+        self.bytes_out += size_out
+        return out_path
+
+    def process_chunk(self, chunk: dict) -> dict:
+        images = [
+            processed
+            for processed in map(self.process_image, chunk.get("images", []))
+            if processed is not None
+        ]
+
+        chunk_type = [t for t in chunk["type"].split(",") if t != "image"]
+        if images:
+            chunk_type.append("image")
+
+        return {**chunk, "images": images, "type": ",".join(chunk_type)}
+
+    def log_summary(self, document_id):
+        logger.info(
+            f"Document {document_id} images: {self.stats}, "
+            f"{self.bytes_in / 1024:.0f} KiB -> {self.bytes_out / 1024:.0f} KiB"
+        )
@@ -0,0 +1,197 @@
+import json
+
+WHITESPACE = " \t\r\n"
+
+
+class StructuredStreamParser:
+    """Incremental parser for a streamed, flat JSON object.
+
+    feed() takes raw text deltas and returns events as soon as they can be
+    decoded:
+
+    - ("delta", key, text): new characters of a string field in stream_fields
+    - ("field", key, value): a top level value has been fully received
+    """
+
+    def __init__(self, stream_fields: set[str]):
+        self.stream_fields = stream_fields
+        self.buf = ""
+        self.pos = 0
+        self.state = "start"
+        self.key = None
+        self.value_start = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_parts = []
+        self.result = {}
+
+    @property
+    def done(self) -> bool:
+        return self.state == "done"
+
+    def _skip_whitespace(self):
+        while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+            self.pos += 1
+
+    def _read_escape(self):
+        """Decode the escape sequence at pos, or return None if incomplete."""
+        buf, pos = self.buf, self.pos
+
+        if pos + 1 >= len(buf):
+            return None
+
+        if buf[pos + 1] != "u":
+            return json.loads(f'"{buf[pos : pos + 2]}"'), 2
+
+        if pos + 6 > len(buf):
+            return None
+
+        code = int(buf[pos + 2 : pos + 6], 16)
+        if 0xD800 <= code <= 0xDBFF:
+            if pos + 12 > len(buf):
+                return None
+            if buf[pos + 6 : pos + 8] == "\\u":
+                return json.loads(f'"{buf[pos : pos + 12]}"'), 12
+
+        return json.loads(f'"{buf[pos : pos + 6]}"'), 6
+
+    def _read_key(self):
+        end = self.pos + 1
+        escape = False
+
+        while end < len(self.buf):
+            char = self.buf[end]
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                key = json.loads(self.buf[self.pos : end + 1])
+                self.pos = end + 1
+                return key
+            end += 1
+
+        return None
+
+    def _finish_value(self, value, events):
+        self.result[self.key] = value
+        events.append(("field", self.key, value))
+        self.state = "next"
+
+    def feed(self, text: str) -> list[tuple]:
+        self.buf += text
+        events = []
+
+        while self.pos < len(self.buf) and self.state != "done":
+            if self.state == "start":
+                self._skip_whitespace()
+                if self.pos < len(self.buf):
+                    if self.buf[self.pos] != "{":
+                        raise ValueError("Expected a JSON object")
+                    self.pos += 1
+                    self.state = "next"
+
+            elif self.state == "next":
+                self._skip_whitespace()
+                if self.pos >= len(self.buf):
+                    break
+                char = self.buf[self.pos]
+                if char == ",":
+                    self.pos += 1
+                elif char == "}":
+                    self.pos += 1
+                    self.state = "done"
+                elif char == '"':
+                    key = self._read_key()
+                    if key is None:
+                        break
+                    self.key = key
+                    self.state = "colon"
+                else:
+                    raise ValueError(f"Unexpected character {char!r}")
+
+            elif self.state == "colon":
+                self._skip_whitespace()
+                if self.pos >= len(self.buf):
+                    break
+                if self.buf[self.pos] != ":":
+                    raise ValueError("Expected ':'")
+                self.pos += 1
+                self.state = "value"
+
+            elif self.state == "value":
+                self._skip_whitespace()
+                if self.pos >= len(self.buf):
+                    break
+                if self.key in self.stream_fields and self.buf[self.pos] == '"':
+                    self.pos += 1
+                    self.string_parts = []
+                    self.state = "stream_string"
+                else:
+                    self.value_start = self.pos
+                    self.depth = 0
+                    self.in_string = False
+                    self.escape = False
+                    self.state = "raw_value"
+
+            elif self.state == "stream_string":
+                delta = []
+                while self.pos < len(self.buf):
+                    char = self.buf[self.pos]
+                    if char == "\\":
+                        decoded = self._read_escape()
+                        if decoded is None:
+                            break
+                        value, length = decoded
+                        delta.append(value)
+                        self.pos += length
+                    elif char == '"':
+                        self.pos += 1
+                        self.state = "closed_string"
+                        break
+                    else:
+                        delta.append(char)
+                        self.pos += 1
+
+                if delta:
+                    self.string_parts.extend(delta)
+                    events.append(("delta", self.key, "".join(delta)))
+
+                if self.state == "closed_string":
+                    self._finish_value("".join(self.string_parts), events)
+                else:
+                    break
+
+            elif self.state == "raw_value":
+                while self.pos < len(self.buf):
+                    char = self.buf[self.pos]
+
+                    if self.in_string:
+                        if self.escape:
+                            self.escape = False
+                        elif char == "\\":
+                            self.escape = True
+                        elif char == '"':
+                            self.in_string = False
+                    elif char == '"':
+                        self.in_string = True
+                    elif char in "[{":
+                        self.depth += 1
+                    elif char in "]}" and self.depth > 0:
+                        self.depth -= 1
+                        if self.depth == 0:
+                            self.pos += 1
+                            raw = self.buf[self.value_start : self.pos]
+                            self._finish_value(json.loads(raw), events)
+                            break
+                    elif self.depth == 0 and (char in ",}" or char in WHITESPACE):
+                        raw = self.buf[self.value_start : self.pos]
+                        self._finish_value(json.loads(raw), events)
+                        break
+
+                    self.pos += 1
+                else:
+                    break
+
+        return events
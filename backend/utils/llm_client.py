@@ -0,0 +1,293 @@
+import time
+import uuid
+import random
+import logging
+import litellm
+from config import settings
+from utils.redis_client import get_redis
+from utils.embedding_batcher import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Rough per-image prompt cost for vision requests.
+IMAGE_TOKEN_ESTIMATE = 1000
+
+RETRYABLE_ERRORS = (
+    litellm.RateLimitError,
+    litellm.Timeout,
+    litellm.APIConnectionError,
+    litellm.InternalServerError,
+    litellm.ServiceUnavailableError,
+)
+
+# Two buckets (requests, tokens) refilled continuously to their per-minute
+# quota. Takes from both or neither; returns the seconds to wait otherwise.
+TOKEN_BUCKET_SCRIPT = """
+local rpm = tonumber(ARGV[1])
+local tpm = tonumber(ARGV[2])
+local cost = math.min(tonumber(ARGV[3]), tpm)
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'ts')
+local requests = tonumber(state[1]) or rpm
+local tokens = tonumber(state[2]) or tpm
+local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+
+requests = math.min(rpm, requests + elapsed * rpm / 60)
+tokens = math.min(tpm, tokens + elapsed * tpm / 60)
+
+local wait = 0
+if requests < 1 then
+    wait = math.max(wait, (1 - requests) * 60 / rpm)
+end
+if tokens < cost then
+    wait = math.max(wait, (cost - tokens) * 60 / tpm)
+end
+if wait == 0 then
+    requests = requests - 1
+    tokens = tokens - cost
+end
+
+redis.call('HSET', KEYS[1], 'requests', requests, 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], 120)
+return tostring(wait)
+"""
+
+# Leases in a sorted set scored by expiry, so a crashed worker's slot frees
+# itself. KEYS: leases, limit. ARGV: lease id, lease ttl, initial limit.
+ACQUIRE_SLOT_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+
+local limit = tonumber(redis.call('GET', KEYS[2]) or ARGV[3])
+if redis.call('ZCARD', KEYS[1]) < math.floor(limit) then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[1])
+    redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[2])))
+    return 1
+end
+return 0
+"""
+
+# Additive increase on success, multiplicative decrease when throttled.
+# KEYS: leases, limit. ARGV: lease id, throttled, initial, min, max.
+RELEASE_SLOT_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+
+local limit = tonumber(redis.call('GET', KEYS[2]) or ARGV[3])
+if ARGV[2] == '1' then
+    limit = math.max(tonumber(ARGV[4]), limit / 2)
+else
+    limit = math.min(tonumber(ARGV[5]), limit + 1 / limit)
+end
+redis.call('SET', KEYS[2], tostring(limit))
+return tostring(limit)
+"""
+
+
+class TokenBucketLimiter:
+    """Requests-per-minute and tokens-per-minute quota shared through Redis."""
+
+    def __init__(self, client, name: str, rpm: int, tpm: int):
+        self.client = client
+        self.key = f"llm:{name}:bucket"
+        self.rpm = rpm
+        self.tpm = tpm
+        self._take = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def acquire(self, tokens: int):
+        while True:
+            wait = float(self._take(keys=[self.key], args=[self.rpm, self.tpm, tokens]))
+            if wait <= 0:
+                return
+            # Jitter so waiters released together do not retry in lockstep.
+            time.sleep(wait + random.uniform(0, 0.05))
+
+    def adjust(self, tokens: int):
+        """Charge (or refund) the difference once actual usage is known."""
+        if tokens:
+            self.client.hincrbyfloat(self.key, "tokens", -tokens)
+
+
+class AdaptiveConcurrencyLimiter:
+    """In-flight call limit shared by all workers, tuned by AIMD."""
+
+    def __init__(
+        self,
+        client,
+        name: str,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        lease_ttl: float = 300,
+    ):
+        self.leases_key = f"llm:{name}:leases"
+        self.limit_key = f"llm:{name}:limit"
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.lease_ttl = lease_ttl
+        self._acquire = client.register_script(ACQUIRE_SLOT_SCRIPT)
+        self._release = client.register_script(RELEASE_SLOT_SCRIPT)
+
+    def acquire(self) -> str:
+        lease_id = uuid.uuid4().hex
+        delay = 0.05
+
+        while not self._acquire(
+            keys=[self.leases_key, self.limit_key],
+            args=[lease_id, self.lease_ttl, self.initial],
+        ):
+            time.sleep(delay + random.uniform(0, delay))
+            delay = min(delay * 2, 1.0)
+
+        return lease_id
+
+    def release(self, lease_id: str, throttled: bool = False):
+        limit = self._release(
+            keys=[self.leases_key, self.limit_key],
+            args=[
+                lease_id,
+                int(throttled),
+                self.initial,
+                self.minimum,
+                self.maximum,
+            ],
+        )
+        if throttled:
+            logger.info(
+                f"Throttled, concurrency limit for {self.limit_key} now {limit}"
+            )
+
+
+def retry_after(error) -> float | None:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_completion_tokens(messages: list[dict], max_tokens: int) -> int:
+    tokens = max_tokens
+
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            tokens += estimate_tokens(content)
+            continue
+        for part in content:
+            if part["type"] == "text":
+                tokens += estimate_tokens(part["text"])
+            else:
+                tokens += IMAGE_TOKEN_ESTIMATE
+
+    return tokens
+
+
+class ModelQuota:
+    def __init__(self, client, model: str, rpm: int, tpm: int):
+        self.bucket = TokenBucketLimiter(client, model, rpm, tpm)
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            client,
+            model,
+            initial=settings.LLM_INITIAL_CONCURRENCY,
+            minimum=1,
+            maximum=settings.LLM_MAX_CONCURRENCY,
+        )
+
+
+class LLMClient:
+    """LiteLLM calls for workers: rate limited, concurrency bounded, retried.
+
+    Only the failing call is retried, with exponential backoff and jitter
+    (or the provider's Retry-After), so a throttled request does not re-run
+    the whole task around it.
+    """
+
+    def __init__(self, client, quotas: dict[str, tuple[int, int]]):
+        self.quotas = {
+            model: ModelQuota(client, model, rpm, tpm)
+            for model, (rpm, tpm) in quotas.items()
+        }
+        self.max_retries = settings.LLM_MAX_RETRIES
+
+    def completion(self, **kwargs):
+        estimated = estimate_completion_tokens(
+            kwargs["messages"], kwargs.get("max_tokens") or 0
+        )
+        return self._call(litellm.completion, kwargs, estimated)
+
+    def embedding(self, **kwargs):
+        estimated = sum(estimate_tokens(text) for text in kwargs["input"])
+        return self._call(litellm.embedding, kwargs, estimated)
+
+    def _call(self, fn, kwargs: dict, estimated: int):
+        quota = self.quotas.get(kwargs["model"])
+
+        for attempt in range(self.max_retries + 1):
+            lease_id = None
+            if quota:
+                quota.bucket.acquire(estimated)
+                lease_id = quota.concurrency.acquire()
+
+            try:
+                response = fn(**kwargs)
+            except RETRYABLE_ERRORS as e:
+                throttled = isinstance(e, litellm.RateLimitError)
+                if quota:
+                    quota.concurrency.release(lease_id, throttled=throttled)
+
+                if attempt == self.max_retries:
+                    raise
+
+                delay = retry_after(e)
+                if delay:
+                    # Never earlier than the provider asked, only spread out.
+                    delay += random.uniform(0, min(delay / 4, 5))
+                else:
+                    backoff = min(60, 2**attempt)
+                    delay = random.uniform(backoff / 2, backoff)
+                logger.warning(
+                    f"{kwargs['model']} call failed ({type(e).__name__}), "
+                    f"retry {attempt + 1}/{self.max_retries} in {delay:.1f} s"
+                )
+                time.sleep(delay)
+                continue
+            except Exception:
+                if quota:
+                    quota.concurrency.release(lease_id)
+                raise
+
+            if quota:
+                quota.concurrency.release(lease_id)
+                usage = getattr(response, "usage", None)
+                total_tokens = getattr(usage, "total_tokens", None)
+                if total_tokens:
+                    quota.bucket.adjust(total_tokens - estimated)
+
+            return response
+
+
+_client = None
+
+
+def get_llm_client() -> LLMClient:
+    global _client
+
+    if _client is None:
+        _client = LLMClient(
+            get_redis(),
+            {
+                settings.SUMMARY_MODEL: (settings.SUMMARY_RPM, settings.SUMMARY_TPM),
+                settings.EMBEDDING_MODEL: (
+                    settings.EMBEDDING_RPM,
+                    settings.EMBEDDING_TPM,
+                ),
+            },
+        )
+
+    return _client
@@ -0,0 +1,103 @@
+import os
+import pymupdf
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, current_process
+
+# Formats the vision model accepts as-is; anything else is re-encoded to PNG.
+PASSTHROUGH_IMAGE_EXTENSIONS = {"png", "jpeg", "jpg"}
+
+
+def _extract_images(doc, page, page_index: int, image_dir: str) -> list[str]:
+    paths = []
+
+    for image_number, image in enumerate(page.get_images(full=True), start=1):
+        xref = image[0]
+        extracted = doc.extract_image(xref)
+        if not extracted:
+            continue
+
+        ext = extracted["ext"].lower()
+        path = os.path.join(image_dir, f"img_p{page_index}_{image_number}")
+
+        if ext in PASSTHROUGH_IMAGE_EXTENSIONS:
+            path = f"{path}.{ext}"
+            with open(path, "wb") as f:
+                f.write(extracted["image"])
+        else:
+            pixmap = pymupdf.Pixmap(doc, xref)
+            if pixmap.n - pixmap.alpha >= 4:
+                pixmap = pymupdf.Pixmap(pymupdf.csRGB, pixmap)
+            path = f"{path}.png"
+            pixmap.save(path)
+
+        paths.append(path)
+
+    return paths
+
+
+def parse_page(doc, page_index: int, image_dir: str) -> dict:
+    page = doc[page_index]
+
+    tables = page.find_tables().tables
+    table_rects = [pymupdf.Rect(t.bbox) for t in tables]
+
+    # Text blocks inside a table are emitted once, as the table's markdown.
+    blocks = [
+        block[4].strip()
+        for block in page.get_text("blocks", sort=True)
+        if block[6] == 0
+        and not any(pymupdf.Rect(block[:4]).intersects(r) for r in table_rects)
+    ]
+    content = "\n\n".join([b for b in blocks if b] + [t.to_markdown() for t in tables])
+
+    images = _extract_images(doc, page, page_index, image_dir)
+
+    chunk_type = ["text"]
+    if tables:
+        chunk_type.append("table")
+    if images:
+        chunk_type.append("image")
+
+    return {
+        "page_number": page_index + 1,
+        "content": content,
+        "images": images,
+        "type": ",".join(chunk_type),
+    }
+
+
+def parse_pages(file_content: bytes, page_indexes: list[int], image_dir: str):
+    with pymupdf.open(stream=file_content, filetype="pdf") as doc:
+        return [parse_page(doc, i, image_dir) for i in page_indexes]
+
+
+def iter_local_pdf_pages(
+    file_content: bytes, image_dir: str, workers: int, pages_per_task: int
+):
+    """Yield chunk dicts page by page, parsing page ranges in a process pool."""
+    os.makedirs(image_dir, exist_ok=True)
+
+    with pymupdf.open(stream=file_content, filetype="pdf") as doc:
+        page_count = doc.page_count
+
+    ranges = [
+        list(range(start, min(start + pages_per_task, page_count)))
+        for start in range(0, page_count, pages_per_task)
+    ]
+
+    # Daemonic processes (e.g. some pool workers) cannot start children.
+    if workers <= 1 or len(ranges) <= 1 or current_process().daemon:
+        for page_indexes in ranges:
+            yield from parse_pages(file_content, page_indexes, image_dir)
+        return
+
+    # spawn, not fork: the caller may already be running thread pools.
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(ranges)), mp_context=get_context("spawn")
+    ) as executor:
+        futures = [
+            executor.submit(parse_pages, file_content, page_indexes, image_dir)
+            for page_indexes in ranges
+        ]
+        for future in futures:
+            yield from future.result()
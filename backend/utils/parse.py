@@ -1,3 +1,9 @@
+import os
+import json
+import hashlib
+import tempfile
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from llama_cloud_services import LlamaParse
 from config import settings
 from utils.s3 import read_file_from_s3
@@ -5,18 +11,113 @@ from collections import defaultdict
 
 LLAMA_PARSE_API_KEY = settings.LLAMA_PARSE_API_KEY
 
+# Bump when parser settings change so stale cache entries are not reused.
+PARSE_CACHE_VERSION = "v1"
 
-def chunk_document(document):
-    file_name = document.filename
-    file_content = read_file_from_s3(document.s3_key)
+logger = logging.getLogger(__name__)
+
+
+def parse_cache_dir(backend: str, file_hash: str) -> str:
+    return os.path.join(
+        settings.PARSE_CACHE_DIR, f"{backend}-{PARSE_CACHE_VERSION}", file_hash
+    )
+
+
+def load_cached_chunks(cache_dir: str):
+    path = os.path.join(cache_dir, "chunks.json")
+
+    if not settings.PARSE_CACHE_ENABLED or not os.path.exists(path):
+        return None
+
+    with open(path) as f:
+        chunks = json.load(f)
+
+    # Images are read from the cache directory at upload time.
+    if not all(os.path.exists(p) for c in chunks for p in c["images"]):
+        return None
+
+    return chunks
+
+
+def store_cached_chunks(cache_dir: str, chunks: list[dict]):
+    if not settings.PARSE_CACHE_ENABLED:
+        return
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # chunks.json marks a complete entry, so write it atomically. The temp
+    # name is unique: workers parsing the same file share this directory.
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(chunks, f)
+        os.replace(tmp_path, os.path.join(cache_dir, "chunks.json"))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class ParserBackend:
+    """Turns a document into page chunks.
+
+    Each chunk is a dict with page_number, content, images (local paths)
+    and type ("text", optionally followed by ",table" / ",image").
+    """
+
+    name = "base"
+    # True if iter_pages() yields pages while the rest is still parsing.
+    streams = False
+
+    def parse(self, file_content: bytes, file_name: str, image_dir: str):
+        raise NotImplementedError
+
+    def iter_pages(self, file_content: bytes, file_name: str, image_dir: str):
+        """Yield chunks as they become available; batch backends yield at the end."""
+        yield from self.parse(file_content, file_name, image_dir)
+
+
+class LlamaParseBackend(ParserBackend):
+    name = "llamaparse"
+
+    def parse(self, file_content: bytes, file_name: str, image_dir: str):
+        return parse_with_llamaparse(file_content, file_name, image_dir)
 
+
+class LocalPDFBackend(ParserBackend):
+    """Parses PDFs locally with PyMuPDF, page ranges spread over processes."""
+
+    name = "local"
+    streams = True
+
+    def __init__(self, workers: int, pages_per_task: int):
+        self.workers = workers
+        self.pages_per_task = pages_per_task
+
+    def parse(self, file_content: bytes, file_name: str, image_dir: str):
+        return list(self.iter_pages(file_content, file_name, image_dir))
+
+    def iter_pages(self, file_content: bytes, file_name: str, image_dir: str):
+        from utils.local_parser import iter_local_pdf_pages
+
+        yield from iter_local_pdf_pages(
+            file_content, image_dir, self.workers, self.pages_per_task
+        )
+
+
+def get_parser_backend() -> ParserBackend:
+    if settings.PARSER_BACKEND == "llamaparse":
+        return LlamaParseBackend()
+    if settings.PARSER_BACKEND == "local":
+        return LocalPDFBackend(settings.PARSER_WORKERS, settings.PARSER_PAGES_PER_TASK)
+    raise ValueError(f"Unsupported PARSER_BACKEND: {settings.PARSER_BACKEND}")
+
+
+def parse_with_llamaparse(file_content: bytes, file_name: str, image_dir: str):
     parser_no_llm = LlamaParse(
         api_key=LLAMA_PARSE_API_KEY,
         parse_mode="parse_page_without_llm",
     )
 
-    result = parser_no_llm.parse(file_content, extra_info={"file_name": file_name})
-
     parser_lvm = LlamaParse(
         api_key=LLAMA_PARSE_API_KEY,
         parse_mode="parse_page_with_lvm",
@@ -28,13 +129,22 @@ def chunk_document(document):
                         Do not insert placeholders for screenshots. Keep all other content as normal markdown.""",
     )
 
-    result_lvm = parser_lvm.parse(file_content, extra_info={"file_name": file_name})
+    # The two passes are independent, run them side by side.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        result_future = executor.submit(
+            parser_no_llm.parse, file_content, extra_info={"file_name": file_name}
+        )
+        result_lvm_future = executor.submit(
+            parser_lvm.parse, file_content, extra_info={"file_name": file_name}
+        )
+        result = result_future.result()
+        result_lvm = result_lvm_future.result()
 
     text_nodes = result_lvm.get_markdown_nodes(split_by_page=True)
     image_nodes = result.get_image_nodes(
         include_object_images=True,
         include_screenshot_images=False,
-        image_download_dir=f"./images/{document.id}/",
+        image_download_dir=image_dir,
     )
 
     images_by_page = defaultdict(list)
@@ -59,3 +169,39 @@ def chunk_document(document):
         )
 
     return chunks
+
+
+def iter_document_chunks(document, backend: ParserBackend | None = None):
+    """Yield the document's chunks in lists, as they become available.
+
+    A streaming backend yields one page per list; a cache hit or a batch
+    backend yields the whole document as a single list.
+    """
+    backend = backend or get_parser_backend()
+
+    file_name = document.filename
+    file_content = read_file_from_s3(document.s3_key)
+    file_hash = hashlib.sha256(file_content).hexdigest()
+    cache_dir = parse_cache_dir(backend.name, file_hash)
+
+    cached = load_cached_chunks(cache_dir)
+    if cached is not None:
+        logger.info(f"Parse cache hit for {file_name} ({file_hash[:12]})")
+        yield cached
+        return
+
+    if settings.PARSE_CACHE_ENABLED:
+        image_dir = os.path.join(cache_dir, "images")
+    else:
+        image_dir = f"./images/{document.id}/"
+
+    if backend.streams:
+        chunks = []
+        for chunk in backend.iter_pages(file_content, file_name, image_dir):
+            chunks.append(chunk)
+            yield [chunk]
+    else:
+        chunks = list(backend.parse(file_content, file_name, image_dir))
+        yield chunks
+
+    store_cached_chunks(cache_dir, chunks)
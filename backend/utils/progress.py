@@ -0,0 +1,69 @@
+from datetime import datetime
+from sqlalchemy import update, select, func
+from models import Chunk, Document, Project
+
+
+def increment_document_progress(
+    db, document_id, summarized: int = 0, embedded: int = 0
+):
+    """Bump progress counters in place, without locking the row for a read."""
+    db.execute(
+        update(Document)
+        .where(Document.id == document_id)
+        .values(
+            chunks_summarized=Document.chunks_summarized + summarized,
+            chunks_embedded=Document.chunks_embedded + embedded,
+        )
+    )
+
+
+def claim_document_completion(db, document_id) -> bool:
+    """Stamp a fully embedded document as complete; True for one caller only.
+
+    Completion is judged from the chunk rows, not the progress counters, so
+    a double count or a stale chunk from an earlier run cannot complete the
+    document early or keep it from completing. The winner is expected to
+    queue finalize_document. Commits the session.
+    """
+    embedded = (
+        select(func.count())
+        .select_from(Chunk)
+        .where(Chunk.document_id == document_id, Chunk.status == "embedded")
+        .scalar_subquery()
+    )
+    claimed = db.execute(
+        update(Document)
+        .where(
+            Document.id == document_id,
+            Document.status == "processing",
+            Document.completed_at.is_(None),
+            Document.total_chunks.is_not(None),
+            Document.total_chunks == embedded,
+        )
+        .values(completed_at=datetime.utcnow())
+        .returning(Document.id)
+    ).scalar()
+    db.commit()
+
+    return claimed is not None
+
+
+def mark_project_ready_if_complete(db, project_id) -> bool:
+    """Flip the project to ready once none of its documents is still pending.
+
+    Call after committing the document's own status, so that when two
+    documents finish together the later one always sees the other as ready.
+    """
+    unfinished = (
+        select(Document.id)
+        .where(Document.project_id == project_id, Document.status != "ready")
+        .exists()
+    )
+    result = db.execute(
+        update(Project)
+        .where(Project.id == project_id, Project.status != "ready", ~unfinished)
+        .values(status="ready")
+    )
+    db.commit()
+
+    return result.rowcount > 0
@@ -0,0 +1,37 @@
+import hashlib
+from litellm import aembedding
+from config import settings
+from utils.cache import TieredCache
+from utils.redis_client import get_async_redis
+
+query_embedding_cache = TieredCache(
+    namespace="query-embedding",
+    max_size=settings.QUERY_EMBEDDING_CACHE_SIZE,
+    ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+    redis=get_async_redis() if settings.QUERY_EMBEDDING_CACHE_REDIS else None,
+)
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+def query_embedding_key(text: str, model: str, dimensions: int) -> str:
+    raw = f"{model}:{dimensions}:{normalize_query(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def embed_query(text: str) -> list[float]:
+    model = settings.EMBEDDING_MODEL
+    dimensions = settings.EMBEDDING_DIMENSIONS
+    key = query_embedding_key(text, model, dimensions)
+
+    cached = await query_embedding_cache.get(key)
+    if cached is not None:
+        return cached
+
+    embed_resp = await aembedding(model=model, input=text, dimensions=dimensions)
+    vector = list(embed_resp.data[0]["embedding"])
+
+    await query_embedding_cache.set(key, vector)
+    return vector
@@ -0,0 +1,28 @@
+import redis
+import redis.asyncio
+from config import settings
+
+_client = None
+
+
+def get_redis():
+    global _client
+
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL or settings.CELERY_BROKER_URL)
+
+    return _client
+
+
+_async_client = None
+
+
+def get_async_redis():
+    global _async_client
+
+    if _async_client is None:
+        _async_client = redis.asyncio.Redis.from_url(
+            settings.REDIS_URL or settings.CELERY_BROKER_URL
+        )
+
+    return _async_client
@@ -1,21 +1,252 @@
-import cohere
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import numpy as np
+from config import settings
+from utils.cache import TieredCache
+from utils.query_embedding import normalize_query
+from utils.redis_client import get_async_redis
 
-co = cohere.ClientV2()
+logger = logging.getLogger(__name__)
 
+# Rough size of a token, for budgeting passages before they are tokenized.
+CHARS_PER_TOKEN = 4
 
-def reranker(query: str, fused_chunks: list[dict]) -> list[dict]:
-    documents = [fc.summarised_content for fc in fused_chunks]
+rerank_score_cache = TieredCache(
+    namespace="rerank-score",
+    max_size=settings.RERANK_CACHE_SIZE,
+    ttl=settings.RERANK_CACHE_TTL,
+    redis=get_async_redis() if settings.RERANK_CACHE_REDIS else None,
+)
 
-    results = co.rerank(
-        model="rerank-v4.0-pro",
-        query=query,
-        documents=documents,
-        top_n=3,
-    )
 
-    reranked = []
-    for r in results.results:
-        chunk = fused_chunks[r.index]
-        reranked.append(chunk)
+class RerankerNotLoadedError(RuntimeError):
+    """Raised when attempting to rerank before the model is loaded."""
+
+
+class RerankerBackend:
+    """Scores query-passage pairs for relevance, higher is better."""
+
+    name = "base"
+    model = None
+
+    async def load(self):
+        pass
+
+    async def unload(self):
+        pass
+
+    def is_loaded(self) -> bool:
+        return True
+
+    async def score(self, query: str, passages: list[str]) -> list[float]:
+        raise NotImplementedError
+
+
+class CohereReranker(RerankerBackend):
+    name = "cohere"
+
+    def __init__(self, model: str):
+        self.model = model
+        self.client = None
+
+    def get_client(self):
+        # Created on first use, so importing this module needs no API key.
+        if self.client is None:
+            import cohere
+
+            self.client = cohere.AsyncClientV2()
+        return self.client
+
+    async def score(self, query: str, passages: list[str]) -> list[float]:
+        # Ask for every passage back so each pair gets a cacheable score.
+        results = await self.get_client().rerank(
+            model=self.model,
+            query=query,
+            documents=passages,
+            top_n=len(passages),
+            max_tokens_per_doc=settings.RERANK_MAX_PASSAGE_TOKENS,
+        )
+
+        scores = [0.0] * len(passages)
+        for r in results.results:
+            scores[r.index] = r.relevance_score
+        return scores
+
+
+class CrossEncoderReranker(RerankerBackend):
+    """Local cross-encoder exported to ONNX, run on CPU.
+
+    `model_path` is a directory with model.onnx and tokenizer.json, e.g. an
+    ONNX export of cross-encoder/ms-marco-MiniLM-L-6-v2.
+    """
+
+    name = "local"
+
+    def __init__(self, model_path: str, batch_size: int, max_length: int, threads: int):
+        self.model_path = model_path
+        self.model = os.path.basename(os.path.normpath(model_path))
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.threads = threads
+
+        self.session = None
+        self.tokenizer = None
+        self.input_names = set()
+
+    async def load(self):
+        """Load the ONNX session and tokenizer if not already loaded."""
+        if self.session is not None and self.tokenizer is not None:
+            return
+
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        start = time.perf_counter()
+        logger.info(f"Loading reranker from {self.model_path}")
+
+        tokenizer = Tokenizer.from_file(f"{self.model_path}/tokenizer.json")
+        # Query and passage share max_length; only the passage is cut.
+        tokenizer.enable_truncation(max_length=self.max_length, strategy="only_second")
+        tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.threads
+
+        self.session = onnxruntime.InferenceSession(
+            f"{self.model_path}/model.onnx",
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = tokenizer
+
+        duration_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"Finished loading reranker in {duration_ms:.2f} ms")
+
+    async def unload(self):
+        self.session = None
+        self.tokenizer = None
+
+    def is_loaded(self) -> bool:
+        return self.session is not None and self.tokenizer is not None
+
+    def get_model(self):
+        """Return the session + tokenizer or raise if not ready."""
+        if not self.is_loaded():
+            raise RerankerNotLoadedError("Reranker model not loaded")
+        return self.session, self.tokenizer
+
+    def predict(self, query: str, passages: list[str]) -> np.ndarray:
+        session, tokenizer = self.get_model()
+        scores = []
+
+        for i in range(0, len(passages), self.batch_size):
+            batch = tokenizer.encode_batch(
+                [(query, p) for p in passages[i : i + self.batch_size]]
+            )
+
+            inputs = {
+                "input_ids": np.array([e.ids for e in batch], dtype=np.int64),
+                "attention_mask": np.array(
+                    [e.attention_mask for e in batch], dtype=np.int64
+                ),
+                "token_type_ids": np.array([e.type_ids for e in batch], dtype=np.int64),
+            }
+            logits = session.run(
+                None, {k: v for k, v in inputs.items() if k in self.input_names}
+            )[0]
+
+            # One relevance logit, or [irrelevant, relevant] for 2-class heads.
+            scores.append(logits[:, -1] if logits.ndim == 2 else logits)
+
+        return np.concatenate(scores)
+
+    async def score(self, query: str, passages: list[str]) -> list[float]:
+        start = time.perf_counter()
+
+        # Inference is CPU bound; keep it off the event loop.
+        scores = await asyncio.to_thread(self.predict, query, passages)
+
+        duration_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"Scored {len(passages)} passages locally in {duration_ms:.2f} ms")
+
+        return scores.tolist()
+
+
+_reranker = None
+
+
+def get_reranker() -> RerankerBackend:
+    global _reranker
+
+    if _reranker is None:
+        if settings.RERANK_BACKEND == "cohere":
+            _reranker = CohereReranker(settings.RERANK_COHERE_MODEL)
+        elif settings.RERANK_BACKEND == "local":
+            _reranker = CrossEncoderReranker(
+                settings.RERANK_MODEL_PATH,
+                settings.RERANK_BATCH_SIZE,
+                settings.RERANK_MAX_LENGTH,
+                settings.RERANK_THREADS,
+            )
+        else:
+            raise ValueError(f"Unsupported RERANK_BACKEND: {settings.RERANK_BACKEND}")
+
+    return _reranker
+
+
+def truncate_passage(text: str, max_tokens: int) -> str:
+    """Cut a passage to roughly `max_tokens`, on a word boundary."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+
+    cut = text.rfind(" ", 0, max_chars)
+    return text[: cut if cut > 0 else max_chars]
+
+
+def rerank_score_key(reranker, query_hash: str, chunk_id, passage: str) -> str:
+    # The passage hash is the chunk's content version: a re-summarized chunk
+    # or a new token budget gets a fresh score.
+    version = hashlib.sha256(passage.encode("utf-8")).hexdigest()[:16]
+    return f"{reranker.name}:{reranker.model}:{query_hash}:{chunk_id}:{version}"
+
+
+async def areranker(query: str, fused_chunks: list, top_n: int | None = None) -> list:
+    """Return the `top_n` most relevant chunks, scoring only uncached pairs."""
+    if not fused_chunks:
+        return []
+
+    reranker = get_reranker()
+    passages = [
+        truncate_passage(c.summarised_content, settings.RERANK_MAX_PASSAGE_TOKENS)
+        for c in fused_chunks
+    ]
+
+    query_hash = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+    keys = [
+        rerank_score_key(reranker, query_hash, c.id, p)
+        for c, p in zip(fused_chunks, passages)
+    ]
+
+    scores = await asyncio.gather(*(rerank_score_cache.get(k) for k in keys))
+    missing = [i for i, score in enumerate(scores) if score is None]
+
+    if missing:
+        fresh = await reranker.score(query, [passages[i] for i in missing])
+        for i, score in zip(missing, fresh):
+            scores[i] = score
+        await asyncio.gather(
+            *(rerank_score_cache.set(keys[i], scores[i]) for i in missing)
+        )
+
+    logger.info(
+        f"Rerank scores: {len(fused_chunks) - len(missing)} cached, "
+        f"{len(missing)} scored"
+    )
 
-    return reranked
+    order = sorted(range(len(fused_chunks)), key=lambda i: -scores[i])
+    return [fused_chunks[i] for i in order[: top_n or settings.RERANK_TOP_N]]
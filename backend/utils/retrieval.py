@@ -0,0 +1,175 @@
+import time
+import logging
+from uuid import UUID
+from sqlalchemy import select, text, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from config import settings
+from db import AsyncSessionLocal
+from models import Chunk
+from utils.vector_search import aset_vector_search_params
+
+logger = logging.getLogger(__name__)
+
+
+# Retrievers return (chunk_id, score) pairs, best first and higher scores
+# better; chunk text is loaded afterwards by hydrate_chunks. Only embedded
+# chunks are searched: pages still being ingested or failed ones have no
+# embedding or summary yet.
+
+
+async def dense_search(
+    project_id: UUID,
+    query_embedding: list[float],
+    limit: int = 20,
+    ef_search: int | None = None,
+    probes: int | None = None,
+):
+    start = time.perf_counter()
+
+    # Each retriever checks out its own pooled connection so dense and
+    # sparse search can run concurrently.
+    async with AsyncSessionLocal() as session:
+        await aset_vector_search_params(session, ef_search, probes)
+
+        distance = Chunk.embedding.cosine_distance(query_embedding)
+
+        rows = (
+            await session.execute(
+                select(Chunk.id, distance.label("distance"))
+                .where(Chunk.project_id == project_id)
+                .where(Chunk.status == "embedded")
+                .where(Chunk.embedding.is_not(None))
+                .order_by(distance)
+                .limit(limit)
+            )
+        ).all()
+
+    duration_ms = (time.perf_counter() - start) * 1000
+    logger.info(f"Vector Retrieved Chunks: {len(rows)} in {duration_ms:.2f} ms")
+
+    return [(row.id, 1 - row.distance) for row in rows]
+
+
+# Okapi BM25 over chunks.search_vector. Document frequencies and corpus size
+# come from the per-project tables the chunks triggers maintain, plus the
+# deltas not rolled up yet; term frequencies are the lexeme position counts.
+# Matching is OR over the query terms, using the GIN index.
+BM25_QUERY = text("""
+    WITH stats AS (
+        SELECT
+            sum(doc_count) AS doc_count,
+            sum(total_length)::float8 / greatest(sum(doc_count), 1) AS avg_length
+        FROM (
+            SELECT doc_count, total_length
+            FROM project_bm25_stats
+            WHERE project_id = :project_id
+            UNION ALL
+            SELECT doc_count, total_length
+            FROM project_bm25_deltas
+            WHERE project_id = :project_id
+        ) s
+    ),
+    query_terms AS (
+        SELECT tsvector_to_array(to_tsvector('english', CAST(:query AS TEXT))) AS terms
+    ),
+    doc_freqs AS (
+        SELECT term, sum(doc_freq) AS doc_freq
+        FROM (
+            SELECT term, doc_freq
+            FROM project_term_stats, query_terms
+            WHERE project_id = :project_id AND term = ANY(query_terms.terms)
+            UNION ALL
+            SELECT term, doc_freq
+            FROM project_term_deltas, query_terms
+            WHERE project_id = :project_id AND term = ANY(query_terms.terms)
+        ) f
+        GROUP BY term
+    ),
+    terms AS (
+        SELECT
+            d.term,
+            ln(1 + (stats.doc_count - d.doc_freq + 0.5) / (d.doc_freq + 0.5)) AS idf
+        FROM doc_freqs d, stats
+        WHERE d.doc_freq > 0
+    )
+    SELECT c.id, sum(
+        terms.idf * m.tf * (CAST(:k1 AS FLOAT8) + 1) / (
+            m.tf + CAST(:k1 AS FLOAT8) * (
+                1 - CAST(:b AS FLOAT8) + CAST(:b AS FLOAT8)
+                * coalesce(c.search_length, stats.avg_length)
+                / greatest(stats.avg_length, 1)
+            )
+        )
+    ) AS score
+    FROM chunks c
+    CROSS JOIN stats
+    CROSS JOIN LATERAL (
+        SELECT u.lexeme, coalesce(array_length(u.positions, 1), 1) AS tf
+        FROM unnest(c.search_vector) u
+    ) m
+    JOIN terms ON terms.term = m.lexeme
+    WHERE c.project_id = :project_id
+      AND c.status = 'embedded'
+      AND c.search_vector @@ replace(
+          plainto_tsquery('english', CAST(:query AS TEXT))::text, ' & ', ' | '
+      )::tsquery
+    GROUP BY c.id
+    ORDER BY score DESC
+    LIMIT :limit
+""")
+
+
+async def sparse_search(project_id: UUID, query: str, limit: int = 20):
+    start = time.perf_counter()
+
+    async with AsyncSessionLocal() as session:
+        rows = (
+            await session.execute(
+                BM25_QUERY,
+                {
+                    "project_id": project_id,
+                    "query": query,
+                    "k1": settings.BM25_K1,
+                    "b": settings.BM25_B,
+                    "limit": limit,
+                },
+            )
+        ).all()
+
+    duration_ms = (time.perf_counter() - start) * 1000
+    logger.info(f"BM25 Retrieved Chunks: {len(rows)} in {duration_ms:.2f} ms")
+
+    return [(row.id, row.score) for row in rows]
+
+
+async def hydrate_chunks(chunk_ids: list[UUID]):
+    """Load what the prompt and citations need, for the final chunks only.
+
+    Returns rows in the order of `chunk_ids`.
+    """
+    if not chunk_ids:
+        return []
+
+    start = time.perf_counter()
+
+    async with AsyncSessionLocal() as session:
+        # One array parameter rather than an IN list of len(chunk_ids).
+        ids = bindparam("chunk_ids", chunk_ids, type_=ARRAY(PG_UUID(as_uuid=True)))
+
+        rows = (
+            await session.execute(
+                select(
+                    Chunk.id,
+                    Chunk.document_id,
+                    Chunk.page_number,
+                    Chunk.summarised_content,
+                ).where(Chunk.id == any_(ids))
+            )
+        ).all()
+
+    by_id = {row.id: row for row in rows}
+
+    duration_ms = (time.perf_counter() - start) * 1000
+    logger.info(f"Hydrated Chunks: {len(rows)} in {duration_ms:.2f} ms")
+
+    return [by_id[chunk_id] for chunk_id in chunk_ids if chunk_id in by_id]
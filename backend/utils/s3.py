@@ -1,5 +1,9 @@
 import boto3
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 from config import settings
 import os
 from datetime import datetime
@@ -16,8 +20,12 @@ s3_client = boto3.client(
     region_name=AWS_REGION,
     aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
     aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+    config=Config(max_pool_connections=max(10, settings.S3_UPLOAD_CONCURRENCY)),
 )
 
+# Image uploads are already parallelised per file by ImageUploadBatch.
+IMAGE_TRANSFER_CONFIG = TransferConfig(use_threads=False)
+
 
 def read_file_from_s3(s3_key: str) -> bytes:
     response = s3_client.get_object(Bucket=S3_BUCKET, Key=s3_key)
@@ -110,11 +118,12 @@ def upload_image_to_s3(
     document_id: UUID,
     chunk_id: UUID,
     page_number: int = 0,
+    client=None,
 ):
+    client = client or s3_client
+
     try:
-        # Read the local image file
-        with open(image_path, "rb") as img_file:
-            image_content = img_file.read()
+        image_size = os.path.getsize(image_path)
 
         # Extract filename from path
         image_filename = os.path.basename(image_path)
@@ -136,19 +145,22 @@ def upload_image_to_s3(
         }
         content_type = content_type_map.get(file_ext, "image/png")
 
-        # Upload to S3
-        s3_client.put_object(
-            Bucket=S3_BUCKET,
-            Key=s3_key,
-            Body=image_content,
-            ContentType=content_type,
-            Metadata={
-                "original_filename": image_filename,
-                "uploaded_at": datetime.now().isoformat(),
-                "document_id": str(document_id),
-                "chunk_id": str(chunk_id),
-                "page_number": str(page_number),
+        # Upload to S3, streamed from disk
+        client.upload_file(
+            image_path,
+            S3_BUCKET,
+            s3_key,
+            ExtraArgs={
+                "ContentType": content_type,
+                "Metadata": {
+                    "original_filename": image_filename,
+                    "uploaded_at": datetime.now().isoformat(),
+                    "document_id": str(document_id),
+                    "chunk_id": str(chunk_id),
+                    "page_number": str(page_number),
+                },
             },
+            Config=IMAGE_TRANSFER_CONFIG,
         )
 
         # # Optional: Clean up local file after successful upload
@@ -161,7 +173,7 @@ def upload_image_to_s3(
             "status": "uploaded",
             "s3_key": s3_key,
             "filename": image_filename,
-            "size": len(image_content),
+            "size": image_size,
         }
 
     except FileNotFoundError:
@@ -170,7 +182,7 @@ def upload_image_to_s3(
             "filename": os.path.basename(image_path),
             "error": f"File not found: {image_path}",
         }
-    except ClientError as e:
+    except (ClientError, S3UploadFailedError) as e:
         return {
             "status": "failed",
             "filename": os.path.basename(image_path),
@@ -184,6 +196,44 @@ def upload_image_to_s3(
         }
 
 
+class ImageUploadBatch:
+    """Uploads images on a bounded thread pool while the caller keeps working.
+
+    submit() returns immediately; results() waits for every upload and is
+    the single place failures are collected and raised.
+    """
+
+    def __init__(self, max_workers: int, client=None):
+        self.client = client or s3_client
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.futures = []
+
+    def submit(self, key, **upload_kwargs):
+        future = self.executor.submit(
+            upload_image_to_s3, client=self.client, **upload_kwargs
+        )
+        self.futures.append((key, future))
+
+    def results(self) -> list[tuple]:
+        results = [(key, future.result()) for key, future in self.futures]
+
+        failed = [r for _, r in results if r["status"] != "uploaded"]
+        if failed:
+            errors = "; ".join(f"{r['filename']}: {r.get('error')}" for r in failed)
+            raise RuntimeError(
+                f"Image upload failed for {len(failed)} of {len(results)} images: "
+                f"{errors}"
+            )
+
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
 async def delete_file_from_s3(s3_key: str):
     if not s3_key:
         return
@@ -195,6 +245,19 @@ async def delete_file_from_s3(s3_key: str):
         raise Exception(f"Failed to delete {s3_key} from S3: {str(e)}")
 
 
+def delete_files_from_s3(s3_keys: list[str]):
+    objects_to_delete = [{"Key": key} for key in s3_keys if key]
+
+    try:
+        for i in range(0, len(objects_to_delete), 1000):
+            batch = objects_to_delete[i : i + 1000]
+            s3_client.delete_objects(Bucket=S3_BUCKET, Delete={"Objects": batch})
+    except Exception as e:
+        raise Exception(
+            f"Failed to delete {len(objects_to_delete)} files from S3: {str(e)}"
+        )
+
+
 async def delete_folder_from_s3(user_id: str, project_id: str):
     if not user_id or not project_id:
         return False
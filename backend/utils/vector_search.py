@@ -0,0 +1,25 @@
+from sqlalchemy import text
+from config import settings
+
+
+def vector_search_params(ef_search: int | None = None, probes: int | None = None):
+    index_type = settings.VECTOR_INDEX_TYPE.lower()
+
+    if index_type == "hnsw":
+        return {
+            "hnsw.ef_search": str(ef_search or settings.HNSW_EF_SEARCH),
+            "hnsw.iterative_scan": settings.HNSW_ITERATIVE_SCAN,
+        }
+
+    return {"ivfflat.probes": str(probes or settings.IVFFLAT_PROBES)}
+
+
+async def aset_vector_search_params(
+    db, ef_search: int | None = None, probes: int | None = None
+):
+    """Apply ANN search settings to the current transaction only."""
+    for name, value in vector_search_params(ef_search, probes).items():
+        await db.execute(
+            text("SELECT set_config(:name, :value, true)"),
+            {"name": name, "value": value},
+        )